@@ -0,0 +1,10 @@
+"""
+Routes of the admin, imported by Banco/urls.py on the first admin/ request. With
+LAZY_STARTUP the admin only looks for the admin.py of the apps here, instead of when
+the process starts.
+"""
+from django.contrib import admin
+
+admin.autodiscover()
+
+urlpatterns = admin.site.get_urls()
@@ -0,0 +1,32 @@
+"""
+Routes of the API documentation (swagger.json, swagger/ and redoc/), imported by
+Banco/urls.py on the first request for one of them: drf_yasg takes a good part of
+the startup of a process that never serves them.
+"""
+from django.conf.urls import url
+from rest_framework import permissions
+from drf_yasg.views import get_schema_view
+from DjangoLivre.schema import API_INFO, openapi_schema
+
+"""
+Swagger is used in conjunction with a set of software tools
+source software for designing, building, documenting, and using RESTful web services.
+"""
+schema_view = get_schema_view(
+   API_INFO,
+   public=True,
+   permission_classes=(permissions.AllowAny,),
+)
+
+"""
+Routes to submit documentation:
+- Requests;
+- Returns
+"""
+urlpatterns = [
+   # built once (see DjangoLivre/schema.py); the pages below read it through SPEC_URL
+   url(r'^swagger(?P<format>\.json|\.yaml)$', openapi_schema, name='schema-json'),
+   url(r'^swagger/$', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
+   url(r'^redoc/$', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
+
+]
@@ -13,58 +13,55 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
-from django.contrib import admin
-from django.urls import path
+from django.urls import URLResolver, path, register_converter
+from django.urls.resolvers import RegexPattern, RoutePattern
 from DjangoLivre.views import CreateUser, UserView, CreateTransfer, TransfersView, UserSearch, TransfersPerformed,\
-     TransfersReceived,  AccountsView, MainPage, AccountView
+     TransfersReceived,  AccountsView, MainPage, AccountView, CreateTransferBatch,\
+     ExportTransfers, AccountStats, CreateUserBatch, Metrics, AccountBalance, QueuedTransferView, \
+     TransferHistory
+from DjangoLivre import async_views
+from DjangoLivre.cpf import CPFConverter
 
-from django.conf.urls import url
-from rest_framework import permissions
-from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
+register_converter(CPFConverter, 'cpf')
+
+
+def lazy_include(pattern, urlconf_name, namespace=None):
+    """
+    include(urlconf_name) that imports the module on the first request that matches
+    pattern, instead of when this module is loaded (reverse() still imports it).
+    """
+    return URLResolver(pattern, urlconf_name, app_name=namespace, namespace=namespace)
 
-"""
-Swagger is used in conjunction with a set of software tools
-source software for designing, building, documenting, and using RESTful web services.
-"""
-schema_view = get_schema_view(
-   openapi.Info(
-      title="Snippets API",
-      default_version='v1',
-      description="Test description",
-      terms_of_service="https://www.google.com/policies/terms/",
-      contact=openapi.Contact(email="contact@snippets.local"),
-      license=openapi.License(name="BSD License"),
-   ),
-   public=True,
-   permission_classes=(permissions.AllowAny,),
-)
 
 urlpatterns = [
-    path('admin/', admin.site.urls),
+    lazy_include(RoutePattern('admin/'), 'Banco.admin_urls', namespace='admin'),
     path('', MainPage.as_view()),
     path('create-user/', CreateUser.as_view()),
-    path('user/<str:cpf>/', UserSearch.as_view()),
+    path('create-users/batch/', CreateUserBatch.as_view()),
+    path('user/<cpf:cpf>/', UserSearch.as_view()),
     path('all-users/', UserView.as_view()),
     path('transfer/', CreateTransfer.as_view()),
+    path('transfer/queue/<uuid:pk>/', QueuedTransferView.as_view()),
+    path('transfers/batch/', CreateTransferBatch.as_view()),
     path('all-transfers/', TransfersView.as_view()),
-    path('transfers-received/<str:cpf>/', TransfersReceived.as_view()),
-    path('transfers-performed/<str:cpf>/', TransfersPerformed.as_view()),
+    path('transfers/export/<str:export_format>/', ExportTransfers.as_view()),
+    path('transfers-received/<cpf:cpf>/', TransfersReceived.as_view()),
+    path('transfers-performed/<cpf:cpf>/', TransfersPerformed.as_view()),
+    path('transfers/<cpf:cpf>/', TransferHistory.as_view()),
     path('all-accounts/', AccountsView.as_view()),
-    path('account/<str:cpf>/', AccountView.as_view()),
+    path('account/<cpf:cpf>/', AccountView.as_view()),
+    path('account/<cpf:cpf>/stats/', AccountStats.as_view()),
+    path('account/<cpf:cpf>/balance/', AccountBalance.as_view()),
+    path('metrics/', Metrics.as_view()),
+    path('async/user/<cpf:cpf>/', async_views.user_search),
+    path('async/account/<cpf:cpf>/', async_views.account_view),
+    path('async/transfers-received/<cpf:cpf>/', async_views.transfers_received),
+    path('async/transfers-performed/<cpf:cpf>/', async_views.transfers_performed),
 
 
 ]
 
-"""
-Routes to submit documentation:
-- Requests;
-- Returns
-"""
-# Swagger
+# Swagger (see Banco/docs_urls.py): swagger.json, swagger.yaml, swagger/ and redoc/
 urlpatterns += [
-   url(r'^swagger(?P<format>\.json|\.yaml)$', schema_view.without_ui(cache_timeout=0), name='schema-json'),
-   url(r'^swagger/$', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
-   url(r'^redoc/$', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
-
+    lazy_include(RegexPattern(r'^(?=swagger|redoc/)'), 'Banco.docs_urls'),
 ]
@@ -1,7 +1,15 @@
 from django.contrib import admin
-from .models import Client, Account, Transfer
+from .models import Client, Account, Transfer, AccountDailyStats, IdempotencyKey, LedgerEntry, BalanceSnapshot, \
+    QueuedTransfer, TransferIntent, BalanceBucket
 
 
 admin.site.register(Account)
 admin.site.register(Client)
 admin.site.register(Transfer)
+admin.site.register(AccountDailyStats)
+admin.site.register(IdempotencyKey)
+admin.site.register(LedgerEntry)
+admin.site.register(BalanceSnapshot)
+admin.site.register(QueuedTransfer)
+admin.site.register(TransferIntent)
+admin.site.register(BalanceBucket)
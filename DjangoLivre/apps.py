@@ -1,6 +1,14 @@
 from django.apps import AppConfig
+from django.core.signals import request_started
+from django.db.backends.signals import connection_created
 
 
 class DjangolivreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'DjangoLivre'
+
+    def ready(self):
+        from . import checks  # registers the system checks
+        from .database import check_connections, set_sqlite_pragmas
+        connection_created.connect(set_sqlite_pragmas)
+        request_started.connect(check_connections)
@@ -0,0 +1,53 @@
+"""
+Database access for the async views (see async_views.py).
+
+Django 3.2 has no async ORM, so the queries of an async view run in threads. They
+are sent to a pool of ASYNC_READ_THREADS threads instead of the single thread
+Django uses for sync code, which bounds the number of open database connections
+while the event loop keeps serving every other connection. With
+ASYNC_READ_THREADS = 0 they run in that single thread, like a sync view.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from .database import check_connections
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def read_pool(size):
+    """The thread pool with `size` threads, created on first use."""
+    with _pools_lock:
+        pool = _pools.get(size)
+        if pool is None:
+            pool = _pools[size] = ThreadPoolExecutor(max_workers=size, thread_name_prefix='djangolivre-read')
+        return pool
+
+
+def closing_connections(func):
+    """
+    Wraps a function run on the pool. request_started/request_finished only clean the
+    connections of the thread handling the request, so the pool threads drop their
+    own expired or broken ones.
+    """
+    @wraps(func)
+    def inner(*args, **kwargs):
+        close_old_connections()
+        check_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+    return inner
+
+
+def database_sync_to_async(func):
+    """sync_to_async for functions that query the database, run on the read pool."""
+    size = settings.ASYNC_READ_THREADS
+    if not size:
+        return sync_to_async(func)
+    return sync_to_async(closing_connections(func), thread_sensitive=False, executor=read_pool(size))
@@ -0,0 +1,110 @@
+"""
+Async versions of the read endpoints, under async/.
+
+They answer like the sync views, but served by an ASGI server
+(`uvicorn Banco.asgi:application`) a request waiting on the database or on a
+slow client only holds a coroutine: the queries run on the read pool of
+async_db.py and the event loop keeps serving the other connections.
+
+Django 3.2 only runs function views as coroutines (async class-based views came
+in 4.1), hence functions instead of APIView classes.
+"""
+from django.http import JsonResponse, HttpResponseNotAllowed
+from rest_framework.exceptions import APIException
+from .async_db import database_sync_to_async
+from .cache import get_account_data, get_client_data
+from .filters import filter_history
+from .models import Client, Account
+from .pagination import TransferKeysetPagination
+from .serializers import TransferRowSerializer
+
+
+def json_response(data, status=200, headers=None):
+    """JsonResponse that writes the JSON like DRF's renderer."""
+    return JsonResponse(data, status=status, headers=headers, safe=False,
+                        json_dumps_params={'ensure_ascii': False, 'separators': (',', ':')})
+
+
+async def user_search(request, cpf):
+    """
+    It expects:
+        - GET as http method;
+        - The ID-CPF, specified on the url;
+        - url/async/user/cpf
+    It returns:
+        - HTTP status = 200 and the same JSON as url/user/cpf;
+        - HTTP status = 404 when there is no user with the cpf.
+    """
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    try:
+        data = await database_sync_to_async(get_client_data)(cpf)
+    except Client.DoesNotExist:
+        return json_response({"error": "Usuário não encontrado"}, status=404)
+    return json_response(data)
+
+
+async def account_view(request, cpf):
+    """
+    It expects:
+        - GET as http method;
+        - The ID-CPF, specified on the url;
+        - url/async/account/cpf
+    It returns:
+        - HTTP status = 200 and the same JSON as url/account/cpf;
+        - HTTP status = 404 when there is no account with the cpf.
+    """
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    try:
+        data = await database_sync_to_async(get_account_data)(cpf)
+    except Account.DoesNotExist:
+        return json_response({"error": "Conta não encontrada"}, status=404)
+    return json_response(data)
+
+
+def _transfer_page(request, cpf, direction, key):
+    paginator = TransferKeysetPagination()
+    transfers = paginator.paginate_queryset(
+        TransferRowSerializer.values(filter_history(cpf, request.GET, direction)), request)
+    return {key: TransferRowSerializer(transfers).data}, paginator.get_headers()
+
+
+async def _transfer_history(request, cpf, direction, key):
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    try:
+        data, headers = await database_sync_to_async(_transfer_page)(request, cpf, direction, key)
+    except APIException as exc:
+        # like DRF's exception handler
+        detail = exc.detail if isinstance(exc.detail, (list, dict)) else {"detail": exc.detail}
+        return json_response(detail, status=exc.status_code)
+    return json_response(data, headers=headers)
+
+
+async def transfers_performed(request, cpf):
+    """
+    It expects:
+        - GET as http method;
+        - The ID-CPF, specified on the url;
+        - url/async/transfers-performed/cpf
+        - The same optional parameters as url/transfers-performed/cpf
+    It returns:
+        - HTTP status = 200 and the same JSON and Link header as url/transfers-performed/cpf
+    """
+    return await _transfer_history(request, cpf, 'performed',
+                                   "Histórico de transferências realizadas pelo usuário")
+
+
+async def transfers_received(request, cpf):
+    """
+    It expects:
+        - GET as http method;
+        - The ID-CPF, specified on the url;
+        - url/async/transfers-received/cpf
+        - The same optional parameters as url/transfers-received/cpf
+    It returns:
+        - HTTP status = 200 and the same JSON and Link header as url/transfers-received/cpf
+    """
+    return await _transfer_history(request, cpf, 'received',
+                                   "Histórico de transferências recebidas pelo usuário")
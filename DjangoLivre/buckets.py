@@ -0,0 +1,96 @@
+"""
+Balance buckets of the hot accounts: the few accounts (merchants) that receive
+transfers all the time and would otherwise have every transfer wait on the lock of
+their Account row.
+
+An account with bucket_count = K (`manage.py set_account_buckets <cpf> --buckets K`)
+keeps part of its balance in K BalanceBucket rows, and its balance is the one of the
+Account row plus the ones of its buckets. A credit goes to a random bucket and leaves
+the Account row alone, so up to K credits of the account are written at the same
+time. A debit is taken from the Account row, or from a bucket with enough money, or,
+when none has enough, from the Account row and every bucket together.
+
+The rows are always locked in the same order, so transfers can not deadlock: the
+Account rows first, in cpf order, and then the buckets, in (cpf, number) order. A
+debit of an account with buckets locks its Account row, so the debits of a hot
+account still go one at a time; only its credits are spread.
+
+bucket_count only tells the credits where to go. Buckets are never deleted, and the
+balance always counts all of them: lowering bucket_count (services.set_bucket_count)
+moves their money back to the Account row, and a credit that picked one of them just
+before still lands in a counted row.
+"""
+import random
+from django.db import models
+from django.db.models import F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from .models import Account, BalanceBucket
+
+# buckets of an account made hot by set_account_buckets without --buckets
+BUCKET_COUNT = 16
+
+def credit_bucket(cpf, value):
+    """
+    Adds value (in cents) to a random bucket of the account, which must have buckets,
+    and returns the number of the bucket.
+    """
+    count = Account.objects.filter(account_user=cpf).values_list('bucket_count', flat=True).get()
+    # bucket 1 when bucket_count went back to 0 meanwhile
+    number = random.randint(1, count) if count else 1
+    BalanceBucket.objects.filter(account_id=cpf, number=number).update(balance=F('balance') + value,
+                                                                      version=F('version') + 1)
+    return number
+
+
+def debit_buckets(cpf, value):
+    """
+    Takes value (in cents) from the account, whose Account row the current transaction
+    must have locked: from a bucket with enough money if there is one, else from the
+    Account row and the buckets together. False when they do not have enough.
+    """
+    numbers = list(BalanceBucket.objects.filter(account_id=cpf, balance__gte=value).values_list('number', flat=True))
+    random.shuffle(numbers)
+    for number in numbers:
+        # another debit may have taken it meanwhile
+        debited = BalanceBucket.objects.filter(account_id=cpf, number=number, balance__gte=value)
+        if debited.update(balance=F('balance') - value, version=F('version') + 1):
+            return True
+
+    account = Account.objects.get(account_user=cpf)
+    buckets = list(BalanceBucket.objects.select_for_update().filter(account_id=cpf).order_by('number'))
+    if account.balance + sum(bucket.balance for bucket in buckets) < value:
+        return False
+    missing, drawn = value, []
+    for row in (account, *buckets):
+        taken = min(row.balance, missing)
+        if taken:
+            row.balance -= taken
+            row.version += 1
+            missing -= taken
+            drawn.append(row)
+        if not missing:
+            break
+    if drawn[0] is account:
+        Account.objects.filter(account_user=cpf).update(balance=account.balance, version=F('version') + 1)
+        drawn = drawn[1:]
+    BalanceBucket.objects.bulk_update(drawn, ['balance', 'version'])
+    return True
+
+
+def bucket_balances(cpfs):
+    """{cpf: sum of the balances of its buckets} of the accounts of cpfs that have buckets."""
+    return dict(BalanceBucket.objects.filter(account_id__in=cpfs).order_by().values('account_id')
+                .annotate(total=Sum('balance')).values_list('account_id', 'total'))
+
+
+def with_buckets(queryset):
+    """
+    Annotates the accounts of the queryset with the sum of the balances (bucket_balance)
+    and of the versions (bucket_version) of their buckets, 0 without buckets.
+    """
+    buckets = BalanceBucket.objects.filter(account_id=OuterRef('pk')).order_by().values('account_id')
+    return queryset.annotate(**{
+        f'bucket_{field}': Coalesce(Subquery(buckets.annotate(total=Sum(field)).values('total')), Value(0),
+                                    output_field=models.BigIntegerField())
+        for field in ('balance', 'version')
+    })
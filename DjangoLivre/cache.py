@@ -0,0 +1,109 @@
+"""
+Read-through cache of the client and account lookups by cpf (the user/<cpf>/ and
+account/<cpf>/ endpoints).
+
+The cache alias and the TTL come from the LOOKUP_CACHE_ALIAS and LOOKUP_CACHE_TTL
+settings, so any backend configured in CACHES can be used.
+
+Every cpf has a generation number stored in the cache and the cached data is keyed
+by it. A write bumps the generation once its transaction commits instead of deleting
+the data: a reader that loaded the old row before the commit stores it under the old
+generation, where nobody will look again, so a stale balance can not be put back in
+the cache after a transfer.
+"""
+import threading
+import time
+from django.conf import settings
+from django.core.cache import caches
+from django.db import router, transaction
+from .buckets import with_buckets
+from .models import Client, Account
+from .serializers import ClientSerializer, AccountSerializer
+
+_stats = {'hits': 0, 'misses': 0}
+_stats_lock = threading.Lock()
+
+
+def get_cache():
+    return caches[settings.LOOKUP_CACHE_ALIAS]
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def cache_stats():
+    """Hits and misses of this process since it started."""
+    with _stats_lock:
+        return dict(_stats)
+
+
+def _generation(cache, cpf):
+    key = f'djangolivre:generation:{cpf}'
+    generation = cache.get(key)
+    if generation is None:
+        # a generation that was evicted must not start again from a number that
+        # may still have data cached under it
+        cache.add(key, time.time_ns(), None)
+        generation = cache.get(key)
+    return generation
+
+
+def _cached(kind, cpf, load):
+    cache = get_cache()
+    key = f'djangolivre:{kind}:{cpf}:{_generation(cache, cpf)}'
+    data = cache.get(key)
+    if data is not None:
+        _count('hits')
+        return data
+    _count('misses')
+    data = load()
+    cache.set(key, data, settings.LOOKUP_CACHE_TTL)
+    return data
+
+
+def get_client_data(cpf):
+    """Serialized client of the cpf. Raises Client.DoesNotExist like Client.objects.get."""
+    return _cached('client', cpf, lambda: dict(ClientSerializer(Client.objects.get(cpf=cpf)).data))
+
+
+def _load_account(cpf):
+    account = with_buckets(Account.objects).get(account_user=cpf)
+    account.balance += account.bucket_balance
+    # the ETag is cached with the data it was read with, so the ETag sent is always
+    # the one of the body sent, however stale the cache of this process is
+    return {
+        'data': dict(AccountSerializer(account).data),
+        'etag': f'{account.number}.{account.version + account.bucket_version}',
+    }
+
+
+def get_account(cpf):
+    """
+    {'data': serialized account, 'etag': its ETag} of the cpf. Raises Account.DoesNotExist
+    like Account.objects.get.
+    """
+    return _cached('account', cpf, lambda: _load_account(cpf))
+
+
+def get_account_data(cpf):
+    """Serialized account of the cpf. Raises Account.DoesNotExist like Account.objects.get."""
+    return get_account(cpf)['data']
+
+
+def invalidate(*cpfs):
+    """
+    Drops the cached client and account of the cpfs when the current transaction
+    commits (right away when there is none).
+    """
+    def bump():
+        cache = get_cache()
+        for cpf in cpfs:
+            key = f'djangolivre:generation:{cpf}'
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.add(key, time.time_ns(), None)
+
+    transaction.on_commit(bump, using=router.db_for_write(Account))
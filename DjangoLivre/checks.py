@@ -0,0 +1,25 @@
+"""
+System checks of the settings that only fail at run time, under load.
+"""
+from django.conf import settings
+from django.core.checks import Error, register
+
+# cache backends that keep the data in the process that wrote it
+PROCESS_LOCAL_CACHES = ('django.core.cache.backends.locmem.LocMemCache',)
+
+
+@register()
+def check_lookup_cache(app_configs, **kwargs):
+    """
+    With TRANSFERS_QUEUED the balances are changed by run_transfer_workers, whose
+    invalidations (see cache.py) have to reach the cache the web processes read.
+    """
+    backend = settings.CACHES[settings.LOOKUP_CACHE_ALIAS]['BACKEND']
+    if settings.TRANSFERS_QUEUED and backend in PROCESS_LOCAL_CACHES:
+        return [Error(
+            f'TRANSFERS_QUEUED needs a cache shared by the processes in LOOKUP_CACHE_ALIAS, not {backend}.',
+            hint='Use memcached, redis or the database cache: the transfer workers would only invalidate '
+                 'their own copy of the balances.',
+            id='DjangoLivre.E001',
+        )]
+    return []
@@ -0,0 +1,51 @@
+"""
+ETag and Last-Modified of the endpoints that clients poll, for Django's condition
+decorator. Each is read before the view runs (with one indexed lookup, or from the
+lookup cache), so an unchanged resource is answered with 304 Not Modified without
+loading or serializing it.
+"""
+from django.db.models import Q
+from .cache import get_account
+from .models import Account, Transfer
+
+
+def account_etag(request, cpf):
+    """
+    The account number and version, taken from the cached account (see cache.py) that
+    the view sends: the version changes with the balance. The versions of the buckets
+    of the account (see buckets.py) are added, as its credits change them instead.
+    """
+    try:
+        request._account = get_account(cpf)
+    except Account.DoesNotExist:
+        return None
+    return request._account['etag']
+
+
+def _latest_transfer(request, fields, cpf):
+    # shared by the ETag and the Last-Modified of a request
+    cache_name = f'_latest_transfer_{"_".join(fields)}'
+    if not hasattr(request, cache_name):
+        condition = Q()
+        for field in fields:
+            condition |= Q(**{field: cpf})
+        latest = Transfer.objects.filter(condition).order_by('-date', '-id').values_list('id', 'date').first()
+        setattr(request, cache_name, latest)
+    return getattr(request, cache_name)
+
+
+def history_conditions(*fields):
+    """
+    The etag_func and last_modified_func of the transfers with the cpf in any of the
+    fields, from the latest of them. Transfers are never changed, so a new one is the
+    only change.
+    """
+    def etag(request, cpf):
+        latest = _latest_transfer(request, fields, cpf)
+        return None if latest is None else str(latest[0])
+
+    def last_modified(request, cpf):
+        latest = _latest_transfer(request, fields, cpf)
+        return None if latest is None else latest[1]
+
+    return {'etag_func': etag, 'last_modified_func': last_modified}
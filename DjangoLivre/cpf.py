@@ -0,0 +1,65 @@
+"""
+CPFs are stored with their 11 digits only (10955470625). The API still accepts the
+formatted CPF (109.554.706-25) anywhere a CPF goes, in the body and on the url, and
+turns it into the stored format before it reaches a query, so every lookup is an
+exact match on the indexed column.
+
+Both the normalization and the check digits are cached: the same few CPFs come in
+over and over (the accounts of a transfer, the user of a history page).
+"""
+import re
+from functools import lru_cache
+from django.core.exceptions import ValidationError
+from django.utils.translation import gettext_lazy as _
+
+CPF_CACHE_SIZE = 65536
+FORMATTED_CPF = re.compile(r'(\d{3})\.(\d{3})\.(\d{3})-(\d{2})')
+
+
+def check_digits(digits):
+    """The two check digits of the first 9 digits of a CPF, as a string."""
+    numbers = [int(digit) for digit in digits]
+    for weight in (10, 11):
+        total = sum(factor * number for factor, number in zip(range(weight, 1, -1), numbers))
+        numbers.append(0 if (11 - total % 11) > 9 else 11 - total % 11)
+    return f'{numbers[-2]}{numbers[-1]}'
+
+
+@lru_cache(maxsize=CPF_CACHE_SIZE)
+def normalize_cpf(value):
+    """
+    The stored format of a CPF: 109.554.706-25 -> 10955470625. Anything that is not a
+    formatted CPF is only stripped, so an invalid value still fails the validation.
+    """
+    value = value.strip()
+    formatted = FORMATTED_CPF.fullmatch(value)
+    return ''.join(formatted.groups()) if formatted else value
+
+
+@lru_cache(maxsize=CPF_CACHE_SIZE)
+def is_valid_cpf(value):
+    """True for 11 digits with the right check digits, except repeated digits (111.111.111-11)."""
+    digits = normalize_cpf(value)
+    if len(digits) != 11 or not digits.isdigit() or digits.count(digits[0]) == 11:
+        return False
+    return check_digits(digits[:9]) == digits[9:]
+
+
+def validate_cpf(value):
+    """Validator of the CPF fields, with the messages of localflavor's BRCPFValidator."""
+    if not is_valid_cpf(value):
+        digits = normalize_cpf(value)
+        if digits.isdigit() and len(digits) != 11:
+            raise ValidationError(_('This field requires at most 11 digits or 14 characters.'), code='max_digits')
+        raise ValidationError(_('Invalid CPF number.'), code='invalid')
+
+
+class CPFConverter:
+    """Path converter (<cpf:cpf>) that hands the views the stored format of the CPF."""
+    regex = '[^/]+'
+
+    def to_python(self, value):
+        return normalize_cpf(value)
+
+    def to_url(self, value):
+        return value
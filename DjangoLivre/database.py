@@ -0,0 +1,53 @@
+"""
+Connection setup shared by every database alias, hooked up in apps.py.
+
+- SQLite connections get the SQLITE_PRAGMAS as soon as they open. With
+  DATABASE_SQLITE_WAL=1 they are journal_mode=WAL, which lets the readers go on
+  while a transfer is being written, and synchronous=NORMAL, which stops fsyncing
+  on every commit (safe with WAL, the last commits may be lost on a power failure,
+  not the database).
+- Persistent connections (CONN_MAX_AGE) with CONN_HEALTH_CHECKS are checked the
+  first time a request uses them and reopened if the server went away, instead of
+  failing the request. The aliases a request does not touch are not checked at all.
+  Django 4.1 does this itself; this project runs on 3.2.
+"""
+from django.conf import settings
+from django.db import connections
+
+
+def set_sqlite_pragmas(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for pragma, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {pragma} = {value}')
+
+
+def _check_on_first_use(connection):
+    # ensure_connection runs before every cursor and transaction; the check is made
+    # by the first one after check_connections()
+    ensure_connection = connection.ensure_connection
+
+    def ensure_usable_connection():
+        if not connection.health_check_done:
+            connection.health_check_done = True
+            if connection.connection is not None and not connection.in_atomic_block \
+                    and not connection.is_usable():
+                connection.close()
+        ensure_connection()
+
+    connection.ensure_connection = ensure_usable_connection
+
+
+def check_connections(**kwargs):
+    """
+    Marks the open connections with CONN_HEALTH_CHECKS to be checked when they are
+    next used; one that can not be used any more is closed then, and reopened by the
+    query that was about to run.
+    """
+    for connection in connections.all():
+        if connection.connection is None or not connection.settings_dict.get('CONN_HEALTH_CHECKS'):
+            continue
+        if not hasattr(connection, 'health_check_done'):
+            _check_on_first_use(connection)
+        connection.health_check_done = False
@@ -0,0 +1,102 @@
+"""
+Query string filters shared by the transfer views.
+"""
+from datetime import datetime, time, timedelta
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import ValidationError
+from .models import Transfer, TransferIntent
+from .money import MAX_CENTS, to_cents
+
+
+def parse_date_bound(value, end=False):
+    """
+    Parses a ?start= or ?end= value, either a datetime ('2021-12-01T18:58:39') or a
+    date ('2021-12-01'), and returns (datetime, inclusive). An end date covers that
+    whole day, so it becomes the start of the next day with inclusive=False.
+    Naive values are taken in the current timezone.
+    """
+    try:
+        moment = parse_datetime(value)
+        inclusive = True
+        if moment is None:
+            day = parse_date(value)
+            if day is None:
+                raise ValueError(value)
+            if end:
+                day, inclusive = day + timedelta(days=1), False
+            moment = datetime.combine(day, time.min)
+    except ValueError:
+        raise ValidationError({'error': f'Data inválida: {value}'})
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment, inclusive
+
+
+def filter_date_range(queryset, params):
+    """Applies the ?start= and ?end= parameters (both inclusive) to a queryset of transfers."""
+    if params.get('start'):
+        start, _ = parse_date_bound(params['start'])
+        queryset = queryset.filter(date__gte=start)
+    if params.get('end'):
+        end, inclusive = parse_date_bound(params['end'], end=True)
+        queryset = queryset.filter(date__lte=end) if inclusive else queryset.filter(date__lt=end)
+    return queryset
+
+
+def filter_day_range(queryset, params):
+    """Applies the ?start= and ?end= dates (both inclusive) to a queryset with a day field."""
+    for param, lookup in (('start', 'day__gte'), ('end', 'day__lte')):
+        if params.get(param):
+            try:
+                day = parse_date(params[param])
+            except ValueError:
+                day = None
+            if day is None:
+                raise ValidationError({'error': f'Data inválida: {params[param]}'})
+            queryset = queryset.filter(**{lookup: day})
+    return queryset
+
+
+def filter_value_range(queryset, params):
+    """Applies the ?min_value= and ?max_value= parameters (in reais, both inclusive) to a queryset of transfers."""
+    for param, lookup in (('min_value', 'value__gte'), ('max_value', 'value__lte')):
+        if params.get(param):
+            try:
+                cents = to_cents(params[param])
+                if abs(cents) > MAX_CENTS:
+                    raise ValueError(cents)
+            except ValueError:
+                raise ValidationError({'error': f'Valor inválido: {params[param]}'})
+            queryset = queryset.filter(**{lookup: cents})
+    return queryset
+
+
+def filter_history(cpf, params, direction=None):
+    """
+    Transfers of the cpf for the history views: the ones it performed (direction
+    'performed'), received ('received') or both (None), filtered by the ?start= and
+    ?end= dates, ?min_value= and ?max_value= and the ?counterparty= cpf.
+
+    The cpf is always the leading column of the (cpf, date) indexes, so every filter
+    is a predicate of that index range scan; both directions are one query with OR,
+    which the database answers from the two indexes.
+    """
+    counterparty = params.get('counterparty')
+    performed, received = Q(source_cpf=cpf), Q(target_cpf=cpf)
+    if counterparty:
+        performed &= Q(target_cpf=counterparty)
+        received &= Q(source_cpf=counterparty)
+    condition = {'performed': performed, 'received': received, None: performed | received}[direction]
+    queryset = Transfer.objects.filter(condition)
+    return filter_value_range(filter_date_range(queryset, params), params)
+
+
+def exclude_credit_copies(queryset):
+    """
+    Leaves out the copies that transfers between shards have in the target shard
+    (see services.execute_transfer_across_shards), for the lists that read every shard.
+    """
+    copies = TransferIntent.objects.filter(status=TransferIntent.CREDITED, transfer__isnull=False).values('transfer')
+    return queryset.exclude(pk__in=copies)
@@ -0,0 +1,99 @@
+"""
+Idempotency-Key support for the endpoints that create transfers.
+
+A client that does not know whether its request went through (a timeout, a
+dropped connection) sends it again with the same Idempotency-Key header, and gets
+back the response stored for the first one instead of a second transfer.
+"""
+import hashlib
+import json
+from datetime import timedelta
+from functools import wraps
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+# headers of the first response that a replay sends again
+REPLAYED_HEADERS = ('Location',)
+
+
+class _Discard(Exception):
+    """Rolls back the reservation of a key whose request did not succeed."""
+
+    def __init__(self, response):
+        self.response = response
+
+
+def expiration():
+    return timezone.now() - timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+
+
+def _fingerprint(request):
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(f'{request.method} {request.path} {body}'.encode()).hexdigest()
+
+
+def _lookup(key):
+    """The stored key (a primary key read), or None. An expired key is deleted."""
+    stored = IdempotencyKey.objects.filter(pk=key).first()
+    if stored is not None and stored.created < expiration():
+        stored.delete()
+        return None
+    return stored
+
+
+def _replay(stored, fingerprint):
+    if stored.request_hash != fingerprint:
+        return Response({"error": "Esta Idempotency-Key já foi usada em outra requisição"},
+                        status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+    return Response(stored.response, status=stored.status_code,
+                    headers={**stored.headers, 'Idempotent-Replayed': 'true'})
+
+
+def idempotent(method):
+    """
+    Decorator for the post method of an APIView.
+
+    Without the header the request is handled as usual. With it, the key is
+    reserved in the same transaction that runs the view, and the response is stored
+    with it if it succeeded (2xx), with its REPLAYED_HEADERS. Failed requests are not stored, so they can be
+    retried with the same key. A second request with the key gets the stored
+    response back without running the view; two requests racing with a new key
+    are serialized by the primary key of IdempotencyKey.
+    """
+    @wraps(method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return method(self, request, *args, **kwargs)
+        if len(key) > IdempotencyKey._meta.get_field('key').max_length:
+            return Response({"error": "Idempotency-Key muito longa"}, status=status.HTTP_400_BAD_REQUEST)
+
+        fingerprint = _fingerprint(request)
+        stored = _lookup(key)
+        if stored is None:
+            try:
+                with transaction.atomic():
+                    record = IdempotencyKey.objects.create(key=key, request_hash=fingerprint)
+                    response = method(self, request, *args, **kwargs)
+                    if not status.is_success(response.status_code):
+                        raise _Discard(response)
+                    record.status_code = response.status_code
+                    record.response = response.data
+                    record.headers = {name: response[name] for name in REPLAYED_HEADERS if response.has_header(name)}
+                    record.save(update_fields=['status_code', 'response', 'headers'])
+                return response
+            except _Discard as discard:
+                return discard.response
+            except IntegrityError:
+                # the same key was committed by a concurrent request meanwhile
+                stored = _lookup(key)
+                if stored is None:
+                    raise
+        return _replay(stored, fingerprint)
+
+    return wrapper
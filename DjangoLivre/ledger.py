@@ -0,0 +1,118 @@
+"""
+Double-entry ledger of the accounts.
+
+Every transfer writes two LedgerEntry rows in its own transaction: a debit (negative
+amount) on the source account and a credit on the target one. The entries are never
+changed afterwards, so they are the history of every balance.
+
+`manage.py snapshot_balances` (run it periodically) stores the balance of the accounts
+that moved since their last BalanceSnapshot. The balance of an account at any moment
+is then its last snapshot before that moment plus the entries that came after it,
+instead of a scan of every transfer.
+"""
+from django.db import models, router, transaction
+from django.db.models import Max, Sum, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from .buckets import with_buckets
+from .models import Account, BalanceBucket, BalanceSnapshot, LedgerEntry
+
+SNAPSHOT_CHUNK_SIZE = 500
+
+
+def record_entries(transfers, debits=True, credits=True):
+    """
+    Writes the debit and the credit of each transfer (only one of them for a
+    transfer between shards, whose accounts are in different databases). The
+    transfers must have their ids, and this must run in the transaction that moved
+    the balances.
+    """
+    entries = []
+    for transfer in transfers:
+        if debits:
+            entries.append(LedgerEntry(account_id=transfer.source_cpf, transfer_id=transfer.id,
+                                       amount=-transfer.value, created=transfer.date))
+        if credits:
+            entries.append(LedgerEntry(account_id=transfer.target_cpf, transfer_id=transfer.id,
+                                       amount=transfer.value, created=transfer.date))
+    LedgerEntry.objects.bulk_create(entries)
+
+
+def _sum_amounts(entries):
+    return entries.aggregate(total=Sum('amount'))['total'] or 0
+
+
+def balance_as_of(cpf, moment, inclusive=True):
+    """
+    Balance of the account, in cents, right after moment (right before it with
+    inclusive=False). Raises Account.DoesNotExist.
+
+    Reads the last snapshot taken at or before moment and adds the entries that came
+    after it. An account without such a snapshot is read backwards instead: its
+    current balance (with its buckets) minus the entries after moment, in a single
+    query so both sides see the same state.
+    """
+    until = 'lte' if inclusive else 'lt'
+    snapshot = (BalanceSnapshot.objects.filter(account_id=cpf, **{f'taken_at__{until}': moment})
+                .order_by('-last_entry_id').first())
+    if snapshot is not None:
+        tail = LedgerEntry.objects.filter(account_id=cpf, id__gt=snapshot.last_entry_id, **{f'created__{until}': moment})
+        return snapshot.balance + _sum_amounts(tail)
+
+    later = (LedgerEntry.objects.filter(account_id=OuterRef('pk')).exclude(**{f'created__{until}': moment})
+             .values('account_id').annotate(total=Sum('amount')).values('total'))
+    account = (with_buckets(Account.objects.filter(pk=cpf))
+               .annotate(later=Coalesce(Subquery(later), Value(0), output_field=models.BigIntegerField()))
+               .values('balance', 'bucket_balance', 'later').get())
+    return account['balance'] + account['bucket_balance'] - account['later']
+
+
+def take_snapshots(chunk_size=SNAPSHOT_CHUNK_SIZE):
+    """
+    Snapshots every account with entries after its last snapshot and returns
+    (snapshots created, accounts whose balance does not match their entries).
+
+    The accounts are locked in cpf order a chunk at a time, so the balance and the last
+    entry are read together, while the transfers of the other accounts go on. The
+    balance is checked against the previous snapshot plus the entries since then.
+    """
+    created, mismatches = 0, []
+    cpfs = list(Account.objects.order_by('account_user').values_list('account_user', flat=True))
+    for start in range(0, len(cpfs), chunk_size):
+        with transaction.atomic(using=router.db_for_write(Account)):
+            accounts = list(Account.objects.select_for_update()
+                            .filter(account_user__in=cpfs[start:start + chunk_size]).order_by('account_user'))
+            accounts_by_cpf = {account.account_user_id: account for account in accounts}
+            # the buckets after the accounts, like the transfers lock them (see buckets.py)
+            buckets = (BalanceBucket.objects.select_for_update()
+                       .filter(account__in=accounts)
+                       .order_by('account', 'number'))
+            for bucket in buckets:
+                accounts_by_cpf[bucket.account_id].balance += bucket.balance
+            last_snapshots = {}
+            for snapshot in BalanceSnapshot.objects.filter(account__in=accounts).order_by('last_entry_id'):
+                last_snapshots[snapshot.account_id] = snapshot
+            # the entries of every account of the chunk after its last snapshot, in one query
+            last_entry = (BalanceSnapshot.objects.filter(account_id=OuterRef('account_id'))
+                          .order_by('-last_entry_id').values('last_entry_id')[:1])
+            tails = {tail['account_id']: tail for tail in (
+                LedgerEntry.objects.filter(account__in=accounts)
+                .filter(id__gt=Coalesce(Subquery(last_entry), Value(0)))
+                .order_by().values('account_id')
+                .annotate(last=Max('id'), taken_at=Max('created'), total=Sum('amount')))}
+            snapshots = []
+            for account in accounts:
+                previous = last_snapshots.get(account.account_user_id)
+                tail = tails.get(account.account_user_id)
+                if tail is None:
+                    continue
+                taken_at = tail['taken_at']
+                if previous is not None:
+                    if previous.balance + tail['total'] != account.balance:
+                        mismatches.append(account.account_user_id)
+                    # every entry up to last_entry_id is at or before taken_at
+                    taken_at = max(taken_at, previous.taken_at)
+                snapshots.append(BalanceSnapshot(account=account, balance=account.balance,
+                                                 last_entry_id=tail['last'], taken_at=taken_at))
+            BalanceSnapshot.objects.bulk_create(snapshots)
+            created += len(snapshots)
+    return created, mismatches
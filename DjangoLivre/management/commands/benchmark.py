@@ -0,0 +1,194 @@
+"""
+Benchmark of the API hot paths: transfers, account and user lookups and transfer
+histories. Run it against the same database and settings between releases and
+diff the JSON reports.
+
+    python manage.py benchmark --clients 100 --requests 500 --concurrency 4 --output bench.json
+    python manage.py benchmark --url http://127.0.0.1:8000 --concurrency 16
+"""
+import json
+import math
+import platform
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+import django
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.db.models import Q
+from django.test import Client as TestClient, override_settings
+from django.utils import timezone
+from DjangoLivre.models import Client, Account, Transfer, TransferIntent
+from DjangoLivre.sharding import shard_for, shards, split_by_shard
+from DjangoLivre.test_utils import generate_valid_cpf
+
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not ordered:
+        return None
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+class _QueryCounter:
+    """execute_wrapper that counts the queries run by the current thread's connections."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class Command(BaseCommand):
+    help = ('Seeds clients, then measures latency (p50/p95/p99), requests per second and SQL '
+            'queries per request of the main endpoints. Uses the test client in this process, '
+            'or a running server with --url.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=50, help='Clients (and accounts) to create')
+        parser.add_argument('--requests', type=int, default=200, help='Requests per endpoint')
+        parser.add_argument('--concurrency', type=int, default=1, help='Requests in flight at once')
+        parser.add_argument('--url', help='Base url of a running server using the same database, e.g. '
+                                          'http://127.0.0.1:8000. Query counts are only measured without it.')
+        parser.add_argument('--output', help='Write the JSON report to this file')
+        parser.add_argument('--seed', type=int, help='Random seed, to repeat the same requests')
+        parser.add_argument('--keep', action='store_true', help='Keep the seeded clients and transfers')
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.url = options['url']
+        self.local = threading.local()
+        cpfs = self.seed(options['clients'])
+        try:
+            # the test client sends its requests to 'testserver', as in the tests
+            with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+                endpoints = {}
+                for name, method, path, body in self.scenarios(cpfs):
+                    endpoints[name] = self.run(method, path, body, options['requests'], options['concurrency'])
+                    self.stdout.write(self.format_line(name, endpoints[name]))
+        finally:
+            if not options['keep']:
+                self.clean(cpfs)
+
+        report = {
+            'meta': {
+                'date': timezone.now().isoformat(),
+                'django': django.get_version(),
+                'python': platform.python_version(),
+                'database': connection.vendor,
+                'target': self.url or 'test client',
+                'clients': options['clients'],
+                'requests': options['requests'],
+                'concurrency': options['concurrency'],
+                'seed': options['seed'],
+            },
+            'endpoints': endpoints,
+        }
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2)
+
+    def seed(self, count):
+        """Creates count clients with their accounts, each one in the shard of its cpf."""
+        cpfs = set()
+        while len(cpfs) < count:
+            cpf = generate_valid_cpf()
+            if cpf not in cpfs and not Client.objects.using(shard_for(cpf)).filter(cpf=cpf).exists():
+                cpfs.add(cpf)
+        cpfs = sorted(cpfs)
+        # bulk_create goes to 'default' unless told otherwise
+        for alias, shard_cpfs in split_by_shard(cpfs, str):
+            Client.objects.using(alias).bulk_create([
+                Client(cpf=cpf, name=f'bench_{cpf}', phone='+5511987654321', email=f'bench_{cpf}@bench.local')
+                for cpf in shard_cpfs
+            ])
+            Account.objects.using(alias).bulk_create([Account(account_user_id=cpf) for cpf in shard_cpfs])
+        return cpfs
+
+    def clean(self, cpfs):
+        for alias in shards():
+            for model in (Transfer, TransferIntent):
+                model.objects.using(alias).filter(Q(source_cpf__in=cpfs) | Q(target_cpf__in=cpfs)).delete()
+            Client.objects.using(alias).filter(cpf__in=cpfs).delete()
+
+    def scenarios(self, cpfs):
+        """(name, method, path, body) of each endpoint; path and body are called per request."""
+        def pick():
+            return self.random.choice(cpfs)
+
+        def transfer():
+            source, target = self.random.sample(cpfs, 2)
+            return {'source_cpf': source, 'target_cpf': target, 'value': 0.01}
+
+        return [
+            ('transfer', 'post', lambda: '/transfer/', transfer),
+            ('account', 'get', lambda: f'/account/{pick()}/', None),
+            ('user', 'get', lambda: f'/user/{pick()}/', None),
+            ('transfers-performed', 'get', lambda: f'/transfers-performed/{pick()}/', None),
+            ('transfers-received', 'get', lambda: f'/transfers-received/{pick()}/', None),
+            ('all-transfers', 'get', lambda: '/all-transfers/', None),
+            ('all-accounts', 'get', lambda: '/all-accounts/', None),
+        ]
+
+    def request(self, method, path, body):
+        """Sends one request and returns (seconds, status code, query count or None)."""
+        if self.url:
+            session = getattr(self.local, 'session', None)
+            if session is None:
+                session = self.local.session = requests.Session()
+            start = time.perf_counter()
+            response = session.request(method, self.url.rstrip('/') + path, json=body)
+            return time.perf_counter() - start, response.status_code, None
+
+        client = getattr(self.local, 'client', None)
+        if client is None:
+            client = self.local.client = TestClient(raise_request_exception=False)
+        counter = _QueryCounter()
+        with ExitStack() as stack:
+            for alias_connection in connections.all():  # every shard and replica
+                stack.enter_context(alias_connection.execute_wrapper(counter))
+            start = time.perf_counter()
+            if body is None:
+                response = getattr(client, method)(path)
+            else:
+                response = getattr(client, method)(path, json.dumps(body), content_type='application/json')
+            elapsed = time.perf_counter() - start
+        return elapsed, response.status_code, counter.count
+
+    def run(self, method, path, body, count, concurrency):
+        calls = [(path(), body() if body else None) for _ in range(count)]
+        start = time.perf_counter()
+        if concurrency > 1:
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                results = list(pool.map(lambda call: self.request(method, *call), calls))
+        else:
+            results = [self.request(method, *call) for call in calls]
+        wall = time.perf_counter() - start
+
+        latencies = sorted(seconds * 1000 for seconds, _, _ in results)
+        queries = [count for _, _, count in results if count is not None]
+        return {
+            'requests': count,
+            'errors': sum(1 for _, status_code, _ in results if status_code >= 400),
+            'requests_per_second': round(count / wall, 2) if wall else None,
+            'latency_ms': {
+                'p50': percentile(latencies, 0.50),
+                'p95': percentile(latencies, 0.95),
+                'p99': percentile(latencies, 0.99),
+                'max': latencies[-1] if latencies else None,
+            },
+            'queries_per_request': round(sum(queries) / len(queries), 2) if queries else None,
+        }
+
+    def format_line(self, name, result):
+        latency = result['latency_ms']
+        queries = result['queries_per_request']
+        return (f"{name:<22} {result['requests_per_second']:>9} req/s  "
+                f"p50 {latency['p50']:.2f}ms  p95 {latency['p95']:.2f}ms  p99 {latency['p99']:.2f}ms  "
+                f"queries {queries if queries is not None else '-'}  errors {result['errors']}")
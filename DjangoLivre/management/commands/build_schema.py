@@ -0,0 +1,21 @@
+"""
+Writes the OpenAPI schema served at swagger.json (see DjangoLivre/schema.py). Run it
+when building the image or deploying, after the code is in place:
+
+    python manage.py build_schema
+    python manage.py build_schema --output /srv/static/openapi.json
+"""
+from django.core.management.base import BaseCommand
+from DjangoLivre.schema import write_schema
+
+
+class Command(BaseCommand):
+    help = ('Builds the OpenAPI schema of every route once, so the processes serve it from a file instead '
+            'of building it on every request.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help='File to write (default: OPENAPI_SCHEMA_FILE)')
+
+    def handle(self, *args, **options):
+        path = write_schema(options['output'])
+        self.stdout.write(f'Esquema OpenAPI gravado em {path}')
@@ -0,0 +1,45 @@
+import csv
+import json
+from django.core.management.base import BaseCommand, CommandError
+from DjangoLivre.onboarding import CHUNK_SIZE, import_clients, read_csv
+
+
+class Command(BaseCommand):
+    help = ('Imports clients (and creates their accounts) from a CSV file with the header '
+            'cpf,name,phone,email or from a JSON list of objects with those keys.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='.csv or .json file')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Clients per transaction')
+        parser.add_argument('--rejected', help='Write the rejected rows to this CSV file')
+        parser.add_argument('--encoding', help='Encoding of the CSV file (default: UTF-8, else Windows-1252)')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if path.endswith('.json'):
+            with open(path, encoding='utf-8') as source:
+                data = json.load(source)
+            if not isinstance(data, list):
+                raise CommandError('O JSON deve ser uma lista de clientes')
+            rows = enumerate(data, start=1)
+        elif path.endswith('.csv'):
+            with open(path, 'rb') as source:
+                try:
+                    rows = list(read_csv(source.read(), options['encoding']))
+                except ValueError as error:
+                    raise CommandError(error)
+        else:
+            raise CommandError('O arquivo deve ser .csv ou .json')
+
+        created, rejected = import_clients(rows, chunk_size=options['chunk_size'])
+
+        if options['rejected']:
+            with open(options['rejected'], 'w', newline='', encoding='utf-8') as output:
+                writer = csv.writer(output)
+                writer.writerow(('linha', 'cpf', 'erros'))
+                for row in rejected:
+                    writer.writerow((row['linha'], row['cpf'], '; '.join(row['erros'])))
+        else:
+            for row in rejected:
+                self.stderr.write(f"linha {row['linha']} ({row['cpf']}): {', '.join(row['erros'])}")
+        self.stdout.write(f'{created} clientes cadastrados, {len(rejected)} linhas recusadas')
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from DjangoLivre.idempotency import expiration
+from DjangoLivre.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = 'Deletes the Idempotency-Key responses older than IDEMPOTENCY_KEY_TTL (run it periodically).'
+
+    def handle(self, *args, **options):
+        deleted, _ = IdempotencyKey.objects.filter(created__lt=expiration()).delete()
+        self.stdout.write(f'{deleted} chaves expiradas removidas')
@@ -0,0 +1,58 @@
+"""
+Applies the transfers queued by the transfer/ endpoint (TRANSFERS_QUEUED = True).
+
+    python manage.py run_transfer_workers --processes 4 --batch-size 200
+    python manage.py run_transfer_workers --once    # drains the queue and exits
+"""
+import multiprocessing
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection, connections
+from DjangoLivre.database import check_connections
+from DjangoLivre.transfer_queue import BATCH_SIZE, process_batch
+
+
+def drain(worker, workers, batch_size, poll, once):
+    """Processes batches until the queue is empty (once) or forever, and returns the count."""
+    processed = 0
+    while True:
+        # no request_started here to expire or check the connections
+        close_old_connections()
+        check_connections()
+        count = process_batch(batch_size, worker, workers)
+        processed += count
+        if count:
+            continue
+        if once:
+            return processed
+        time.sleep(poll)
+
+
+class Command(BaseCommand):
+    help = ('Applies the queued transfers in batches. Every process takes its own share of the source '
+            'accounts, so no two of them debit the same account; they can still wait for each other on the '
+            'lock of a target account.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=1, help='Worker processes')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Transfers per transaction')
+        parser.add_argument('--poll', type=float, default=0.5, help='Seconds to wait when the queue is empty')
+        parser.add_argument('--once', action='store_true', help='Exit when the queue is empty')
+
+    def handle(self, *args, **options):
+        processes = options['processes']
+        if processes < 1:
+            raise CommandError('--processes deve ser pelo menos 1')
+        if processes > 1 and connection.vendor == 'sqlite':
+            raise CommandError('O SQLite aceita uma escrita por vez: use --processes 1')
+        arguments = [(worker, processes, options['batch_size'], options['poll'], options['once'])
+                     for worker in range(processes)]
+
+        if processes == 1:
+            processed = drain(*arguments[0])
+        else:
+            # the children must not share the parent's database connections
+            connections.close_all()
+            with multiprocessing.get_context('fork').Pool(processes) as pool:
+                processed = sum(pool.starmap(drain, arguments))
+        self.stdout.write(f'{processed} transferências processadas')
@@ -0,0 +1,33 @@
+"""
+Spreads the credits of hot accounts over balance buckets (see DjangoLivre/buckets.py).
+
+    python manage.py set_account_buckets 10955470625 97417972144 --buckets 16
+    python manage.py set_account_buckets 10955470625 --buckets 0    # back to the Account row only
+"""
+from django.core.management.base import BaseCommand, CommandError
+from DjangoLivre.buckets import BUCKET_COUNT
+from DjangoLivre.cpf import normalize_cpf
+from DjangoLivre.models import Account
+from DjangoLivre.services import set_bucket_count
+from DjangoLivre.sharding import shard_for, using_shard
+
+
+class Command(BaseCommand):
+    help = ('Keeps the balance of the given accounts in several rows, so the transfers they receive '
+            'do not all wait on the lock of one row.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('cpfs', nargs='+', help='CPFs of the accounts')
+        parser.add_argument('--buckets', type=int, default=BUCKET_COUNT, help='Buckets per account (0 turns them off)')
+
+    def handle(self, *args, **options):
+        count = options['buckets']
+        if count < 0:
+            raise CommandError('--buckets não pode ser negativo')
+        for cpf in map(normalize_cpf, options['cpfs']):
+            with using_shard(shard_for(cpf)):
+                try:
+                    set_bucket_count(cpf, count)
+                except Account.DoesNotExist:
+                    raise CommandError(f'Conta {cpf} não encontrada')
+        self.stdout.write(f'{len(options["cpfs"])} contas com {count} compartimentos')
@@ -0,0 +1,22 @@
+"""
+Finishes the transfers between shards left prepared by a crash (see
+services.execute_transfer_across_shards). Run it periodically when DATABASE_SHARD_URLS is set.
+
+    python manage.py settle_transfers --older-than 60
+"""
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from DjangoLivre.services import SETTLE_AFTER, settle_transfer_intents
+
+
+class Command(BaseCommand):
+    help = ('Credits the target account of the transfers between shards that were debited and not '
+            'credited, or gives the money back when the target account is gone.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=float, default=SETTLE_AFTER.total_seconds(),
+                            help='Seconds a transfer must be prepared for, so the ones in progress are left alone')
+
+    def handle(self, *args, **options):
+        settled = settle_transfer_intents(timedelta(seconds=options['older_than']))
+        self.stdout.write(f'{settled} transferências concluídas')
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from DjangoLivre.ledger import SNAPSHOT_CHUNK_SIZE, take_snapshots
+from DjangoLivre.sharding import shards, using_shard
+
+
+class Command(BaseCommand):
+    help = ('Stores the balance of every account that moved since its last snapshot, so balances at a '
+            'past date only read the ledger entries after it (run it periodically).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=SNAPSHOT_CHUNK_SIZE,
+                            help='Accounts locked and snapshotted per transaction')
+
+    def handle(self, *args, **options):
+        created, mismatches = 0, []
+        for db in shards():
+            with using_shard(db):
+                shard_created, shard_mismatches = take_snapshots(options['chunk_size'])
+            created += shard_created
+            mismatches += shard_mismatches
+        self.stdout.write(f'{created} saldos registrados')
+        for cpf in mismatches:
+            self.stderr.write(f'Saldo da conta {cpf} diferente dos lançamentos')
@@ -0,0 +1,111 @@
+"""
+Startup profile of a worker: the modules it imports until it can serve its first
+request, how long each one takes (python -X importtime), and the time and memory the
+whole startup takes. Run it before and after adding a dependency, and with --lazy
+to see what LAZY_STARTUP leaves out.
+
+importtime has no line for the modules loaded with importlib.import_module, which is
+how Django loads the apps, their models and admin.py, the middleware and the URLconf;
+the modules they import have theirs. The report lists every module loaded in
+'modules'.
+
+    python manage.py startup_profile
+    python manage.py startup_profile --lazy --limit 30 --output startup.json
+"""
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# what a WSGI worker does before its first request: settings, apps and models,
+# middleware and the URLconf
+STARTUP = """
+import json, resource, sys, time
+start = time.perf_counter()
+from django.core.wsgi import get_wsgi_application
+get_wsgi_application()
+from django.urls import get_resolver
+get_resolver().url_patterns
+print(json.dumps({
+    'seconds': time.perf_counter() - start,
+    'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    'modules': sorted(sys.modules),
+}))
+"""
+
+
+def parse_importtime(lines):
+    """
+    [{'module', 'self_ms', 'cumulative_ms', 'depth'}] of the lines written by
+    `python -X importtime`; depth 0 is a module imported by the startup itself.
+    """
+    modules = []
+    for line in lines:
+        if not line.startswith('import time:'):
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        if not self_us.strip().isdigit():
+            continue  # header
+        modules.append({
+            'module': name.strip(),
+            'self_ms': int(self_us) / 1000,
+            'cumulative_ms': int(cumulative_us) / 1000,
+            'depth': (len(name) - len(name.lstrip()) - 1) // 2,
+        })
+    return modules
+
+
+class Command(BaseCommand):
+    help = ('Starts a worker in a new process with python -X importtime and reports the time of the '
+            'startup, its memory and the modules that take the longest to import.')
+    # the process it starts is the one profiled; this one does not need to be checked
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lazy', action='store_true', help='Start it with LAZY_STARTUP=1')
+        parser.add_argument('--limit', type=int, default=20, help='Modules and packages to list')
+        parser.add_argument('--sort', choices=('cumulative', 'self'), default='cumulative',
+                            help='cumulative: with the modules each one imports; self: without them')
+        parser.add_argument('--output', help='Write the JSON report, with every module, to this file')
+
+    def handle(self, *args, **options):
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'Banco.settings')}
+        if options['lazy']:
+            env['LAZY_STARTUP'] = '1'
+        process = subprocess.run([sys.executable, '-X', 'importtime', '-c', STARTUP], cwd=settings.BASE_DIR,
+                                 env=env, capture_output=True, text=True)
+        if process.returncode:
+            raise CommandError(f'O processo não iniciou:\n{process.stderr}')
+
+        startup = json.loads(process.stdout.splitlines()[-1])
+        modules = parse_importtime(process.stderr.splitlines())
+        packages = defaultdict(float)
+        for module in modules:
+            packages[module['module'].split('.')[0]] += module['self_ms']
+        report = {
+            'lazy': env.get('LAZY_STARTUP') == '1',
+            'seconds': round(startup['seconds'], 3),
+            'max_rss_mb': round(startup['max_rss_kb'] / 1024, 1),
+            'modules': startup['modules'],
+            'import_ms': round(sum(module['self_ms'] for module in modules), 1),
+            'packages': {name: round(ms, 1) for name, ms in sorted(packages.items(), key=lambda item: -item[1])},
+            'imports': modules,
+        }
+
+        self.stdout.write(f"Inicialização em {report['seconds']:.3f}s, {report['max_rss_mb']} MB de memória (RSS), "
+                          f"{len(report['modules'])} módulos, {report['import_ms']:.0f}ms em imports"
+                          f"{' (LAZY_STARTUP)' if report['lazy'] else ''}")
+        self.stdout.write(f"\n{'ms':>9}  pacote")
+        for name, ms in list(report['packages'].items())[:options['limit']]:
+            self.stdout.write(f'{ms:>9.1f}  {name}')
+        key = f"{options['sort']}_ms"
+        self.stdout.write(f"\n{'próprio':>9} {'total':>9}  módulo")
+        for module in sorted(modules, key=lambda module: -module[key])[:options['limit']]:
+            self.stdout.write(f"{module['self_ms']:>9.1f} {module['cumulative_ms']:>9.1f}  {module['module']}")
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2)
@@ -0,0 +1,75 @@
+"""
+In-process request metrics, exposed in the Prometheus text format by the metrics/
+endpoint. They are filled by InstrumentationMiddleware (see middleware.py).
+
+Every process (worker) keeps its own numbers; Prometheus sums them when it
+scrapes each worker.
+"""
+import threading
+from .cache import cache_stats
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+    """Cumulative histogram per label values, like prometheus_client's."""
+
+    def __init__(self, name, description, labels, buckets):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.buckets = buckets
+        self.samples = {}
+        self.lock = threading.Lock()
+
+    def observe(self, label_values, value):
+        with self.lock:
+            sample = self.samples.get(label_values)
+            if sample is None:
+                sample = self.samples[label_values] = [[0] * len(self.buckets), 0, 0]
+            counts = sample[0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+            sample[1] += value
+            sample[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} histogram']
+        with self.lock:
+            samples = sorted((labels, [list(sample[0]), sample[1], sample[2]])
+                             for labels, sample in self.samples.items())
+        for label_values, (counts, total, count) in samples:
+            labels = ','.join(f'{name}="{value}"' for name, value in zip(self.labels, label_values))
+            for bound, bucket_count in zip(self.buckets, counts):
+                lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {bucket_count}')
+            lines.append(f'{self.name}_bucket{{{labels},le="+Inf"}} {count}')
+            lines.append(f'{self.name}_sum{{{labels}}} {total}')
+            lines.append(f'{self.name}_count{{{labels}}} {count}')
+        return lines
+
+
+REQUEST_DURATION = Histogram('djangolivre_request_duration_seconds', 'Total time to answer a request.',
+                             ('view', 'method'), LATENCY_BUCKETS)
+DB_DURATION = Histogram('djangolivre_db_duration_seconds', 'Time spent running SQL queries per request.',
+                        ('view', 'method'), LATENCY_BUCKETS)
+SERIALIZE_DURATION = Histogram('djangolivre_serialize_duration_seconds',
+                               'Time spent in the serializers per request, without their SQL queries.',
+                               ('view', 'method'), LATENCY_BUCKETS)
+RENDER_DURATION = Histogram('djangolivre_render_duration_seconds', 'Time spent rendering the response body.',
+                            ('view', 'method'), LATENCY_BUCKETS)
+DB_QUERIES = Histogram('djangolivre_db_queries', 'SQL queries run per request.',
+                       ('view', 'method'), QUERY_BUCKETS)
+HISTOGRAMS = (REQUEST_DURATION, DB_DURATION, SERIALIZE_DURATION, RENDER_DURATION, DB_QUERIES)
+
+
+def render_metrics():
+    """All the metrics of this process in the Prometheus text format."""
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.render())
+    for name, value in cache_stats().items():
+        lines.append(f'# TYPE djangolivre_lookup_cache_{name}_total counter')
+        lines.append(f'djangolivre_lookup_cache_{name}_total {value}')
+    return '\n'.join(lines) + '\n'
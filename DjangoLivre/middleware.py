@@ -0,0 +1,182 @@
+"""
+Middleware of the project: the instrumentation of every request (SQL queries, SQL,
+serializer and render time, on the Server-Timing header and the metrics/ endpoint),
+and the choice of the shard and of the read replica that answer it.
+"""
+import asyncio
+from time import perf_counter
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from . import metrics
+from .replicas import PIN_COOKIE, SAFE_METHODS, choose_replica, replicas, set_current_replica, using_replica
+from .sharding import set_current_shard, shard_for, using_shard
+from .timing import RequestTiming, current_timing, timing_request
+
+
+def _record_query(execute, sql, params, many, context):
+    # installed once on every connection; the context variable, which follows the
+    # request into the threads that run its queries, tells which request to charge
+    timing = current_timing()
+    if timing is None:
+        return execute(sql, params, many, context)
+    start = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timing.db += perf_counter() - start
+        timing.queries += 1
+
+
+def _install(connection, **kwargs):
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _record_query)
+
+
+connection_created.connect(_install)
+
+
+def _view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved'
+    view = getattr(match.func, 'view_class', match.func)
+    return getattr(view, '__name__', match.view_name)
+
+
+class InstrumentationMiddleware:
+    """
+    Measures every request: SQL queries and the time spent on them, the time spent
+    in the serializers (see timing.serializing), the time spent rendering the
+    response body and the total time. They are sent back on the Server-Timing header,
+    which the browser dev tools show, and added to the histograms of the metrics/
+    endpoint.
+
+    It runs in async mode under ASGI, so it does not take a thread away from the
+    async views. Set INSTRUMENTATION_ENABLED = False to leave the middleware out of
+    the request path entirely.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.INSTRUMENTATION_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    @staticmethod
+    def install():
+        # connections opened before this module was imported missed connection_created
+        for connection in connections.all():
+            _install(connection)
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        self.install()
+        timing = request._timing = RequestTiming()
+        start = perf_counter()
+        with timing_request(timing):
+            response = self.get_response(request)
+        return self.finish(request, response, timing, perf_counter() - start)
+
+    async def __acall__(self, request):
+        self.install()
+        timing = request._timing = RequestTiming()
+        start = perf_counter()
+        with timing_request(timing):
+            response = await self.get_response(request)
+        return self.finish(request, response, timing, perf_counter() - start)
+
+    def finish(self, request, response, timing, total):
+        labels = (_view_name(request), request.method)
+        metrics.REQUEST_DURATION.observe(labels, total)
+        metrics.DB_DURATION.observe(labels, timing.db)
+        metrics.SERIALIZE_DURATION.observe(labels, timing.serialize)
+        metrics.RENDER_DURATION.observe(labels, timing.render)
+        metrics.DB_QUERIES.observe(labels, timing.queries)
+
+        app = max(total - timing.db - timing.serialize - timing.render, 0)
+        response['Server-Timing'] = (
+            f'db;dur={timing.db * 1000:.2f};desc="{timing.queries} queries", '
+            f'serialize;dur={timing.serialize * 1000:.2f}, render;dur={timing.render * 1000:.2f}, '
+            f'app;dur={app * 1000:.2f}, total;dur={total * 1000:.2f}'
+        )
+        return response
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered to JSON right after this hook returns
+        timing = request._timing
+        timing.render_start = perf_counter()
+        response.add_post_render_callback(timing.rendered)
+        return response
+
+
+class ShardMiddleware:
+    """
+    Sends the queries of the views with a <cpf> on the url to the shard of that cpf
+    (see sharding.py). The shard is picked in process_view, once the url is resolved,
+    and forgotten when the response is done.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        with using_shard(None):
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        with using_shard(None):
+            return await self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        cpf = view_kwargs.get('cpf')
+        if cpf is not None:
+            set_current_shard(shard_for(cpf))
+
+
+class ReplicaMiddleware:
+    """
+    Answers the GET requests of the views with replica_reads = True from a read
+    replica (see replicas.py), unless the client wrote something in the last
+    REPLICA_PIN_SECONDS, and marks the clients that write with the cookie that
+    keeps them on the primary.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        with using_replica(None):
+            return self.pin(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        with using_replica(None):
+            return self.pin(request, await self.get_response(request))
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view = getattr(view_func, 'view_class', view_func)
+        if (request.method in SAFE_METHODS and getattr(view, 'replica_reads', False)
+                and PIN_COOKIE not in request.COOKIES):
+            set_current_replica(choose_replica())
+
+    def pin(self, request, response):
+        if replicas() and request.method not in SAFE_METHODS and response.status_code < 400:
+            response.set_cookie(PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS, httponly=True, samesite='Lax')
+        return response
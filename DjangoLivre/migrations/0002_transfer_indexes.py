@@ -0,0 +1,25 @@
+# Generated by Django 3.2.9 on 2026-10-18 12:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('DjangoLivre', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transfer',
+            index=models.Index(fields=['source_cpf', 'date'], name='transfer_source_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transfer',
+            index=models.Index(fields=['target_cpf', 'date'], name='transfer_target_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transfer',
+            index=models.Index(fields=['date'], name='transfer_date_idx'),
+        ),
+    ]
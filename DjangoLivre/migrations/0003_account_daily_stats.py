@@ -0,0 +1,59 @@
+# Generated by Django 3.2.9 on 2026-10-18 12:13
+
+from django.db import migrations, models
+import django.db.models.deletion
+from collections import defaultdict
+from django.utils import timezone
+
+
+def backfill_daily_stats(apps, schema_editor):
+    """Builds the statistics of the transfers made before the table existed."""
+    Account = apps.get_model('DjangoLivre', 'Account')
+    AccountDailyStats = apps.get_model('DjangoLivre', 'AccountDailyStats')
+    Transfer = apps.get_model('DjangoLivre', 'Transfer')
+
+    accounts = set(Account.objects.values_list('account_user_id', flat=True))
+    stats = defaultdict(lambda: [0, 0, 0, 0])
+    for source_cpf, target_cpf, value, date in Transfer.objects.values_list(
+            'source_cpf', 'target_cpf', 'value', 'date').iterator():
+        day = timezone.localdate(date)
+        sent = stats[source_cpf, day]
+        sent[0] += 1
+        sent[1] += value
+        received = stats[target_cpf, day]
+        received[2] += 1
+        received[3] += value
+
+    AccountDailyStats.objects.bulk_create([
+        AccountDailyStats(account_id=cpf, day=day, sent_count=sent_count, sent_total=sent_total,
+                          received_count=received_count, received_total=received_total)
+        for (cpf, day), (sent_count, sent_total, received_count, received_total) in stats.items()
+        if cpf in accounts
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('DjangoLivre', '0002_transfer_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccountDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='Dia')),
+                ('sent_count', models.PositiveIntegerField(default=0, verbose_name='Transferências enviadas')),
+                ('sent_total', models.FloatField(default=0, verbose_name='Total enviado')),
+                ('received_count', models.PositiveIntegerField(default=0, verbose_name='Transferências recebidas')),
+                ('received_total', models.FloatField(default=0, verbose_name='Total recebido')),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='DjangoLivre.account', verbose_name='Conta')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='accountdailystats',
+            constraint=models.UniqueConstraint(fields=('account', 'day'), name='account_daily_stats_unique'),
+        ),
+        migrations.RunPython(backfill_daily_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,50 @@
+from django.db import migrations, models
+from django.db.models import F
+from django.db.models.functions import Round
+
+
+def to_cents(apps, schema_editor):
+    """
+    Multiplies the amounts by 100, rounded to whole cents. The float columns keep
+    their types and the next migration changes them; the balance was made a bigint
+    first, as 100 times a balance does not fit an integer column.
+    """
+    Account = apps.get_model('DjangoLivre', 'Account')
+    AccountDailyStats = apps.get_model('DjangoLivre', 'AccountDailyStats')
+    Transfer = apps.get_model('DjangoLivre', 'Transfer')
+
+    Account.objects.update(balance=Round(F('balance') * 100))
+    Transfer.objects.update(value=Round(F('value') * 100))
+    AccountDailyStats.objects.update(sent_total=Round(F('sent_total') * 100),
+                                     received_total=Round(F('received_total') * 100))
+
+
+def to_reais(apps, schema_editor):
+    """
+    Divides the amounts by 100. The old balance column is an integer: SQLite keeps
+    the cents there anyway, other databases round the balance to whole reais.
+    """
+    Account = apps.get_model('DjangoLivre', 'Account')
+    AccountDailyStats = apps.get_model('DjangoLivre', 'AccountDailyStats')
+    Transfer = apps.get_model('DjangoLivre', 'Transfer')
+
+    Account.objects.update(balance=F('balance') / 100.0)
+    Transfer.objects.update(value=F('value') / 100.0)
+    AccountDailyStats.objects.update(sent_total=F('sent_total') / 100.0,
+                                     received_total=F('received_total') / 100.0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('DjangoLivre', '0003_account_daily_stats'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='account',
+            name='balance',
+            field=models.PositiveBigIntegerField(blank=True, default=5000, verbose_name='Saldo'),
+        ),
+        migrations.RunPython(to_cents, to_reais),
+    ]
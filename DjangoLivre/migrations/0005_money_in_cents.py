@@ -0,0 +1,34 @@
+# Generated by Django 3.2.9 on 2026-10-18 12:15
+
+import DjangoLivre.models
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('DjangoLivre', '0004_convert_money_to_cents'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='account',
+            name='balance',
+            field=DjangoLivre.models.CentsField(blank=True, default=500000, verbose_name='Saldo'),
+        ),
+        migrations.AlterField(
+            model_name='accountdailystats',
+            name='received_total',
+            field=DjangoLivre.models.CentsField(default=0, verbose_name='Total recebido'),
+        ),
+        migrations.AlterField(
+            model_name='accountdailystats',
+            name='sent_total',
+            field=DjangoLivre.models.CentsField(default=0, verbose_name='Total enviado'),
+        ),
+        migrations.AlterField(
+            model_name='transfer',
+            name='value',
+            field=DjangoLivre.models.CentsField(default=0, verbose_name='Valor'),
+        ),
+    ]
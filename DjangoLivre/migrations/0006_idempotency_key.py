@@ -0,0 +1,23 @@
+# Generated by Django 3.2.9 on 2026-10-18 12:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('DjangoLivre', '0005_money_in_cents'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdempotencyKey',
+            fields=[
+                ('key', models.CharField(max_length=255, primary_key=True, serialize=False, verbose_name='Chave')),
+                ('request_hash', models.CharField(max_length=64, verbose_name='Hash da requisição')),
+                ('status_code', models.PositiveSmallIntegerField(default=0)),
+                ('response', models.JSONField(null=True)),
+                ('created', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 3.2.9 on 2026-10-18 12:28
+
+import DjangoLivre.models
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_ledger(apps, schema_editor):
+    """Writes the entries of the transfers made before the ledger existed."""
+    Account = apps.get_model('DjangoLivre', 'Account')
+    LedgerEntry = apps.get_model('DjangoLivre', 'LedgerEntry')
+    Transfer = apps.get_model('DjangoLivre', 'Transfer')
+
+    accounts = set(Account.objects.values_list('account_user_id', flat=True))
+    entries = []
+    for pk, source_cpf, target_cpf, value, date in Transfer.objects.values_list(
+            'id', 'source_cpf', 'target_cpf', 'value', 'date').order_by('id').iterator():
+        if source_cpf in accounts:
+            entries.append(LedgerEntry(account_id=source_cpf, transfer_id=pk, amount=-value, created=date))
+        if target_cpf in accounts:
+            entries.append(LedgerEntry(account_id=target_cpf, transfer_id=pk, amount=value, created=date))
+    LedgerEntry.objects.bulk_create(entries, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('DjangoLivre', '0006_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.BigIntegerField(verbose_name='Valor')),
+                ('created', models.DateTimeField(verbose_name='Data')),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ledger_entries', to='DjangoLivre.account', verbose_name='Conta')),
+                ('transfer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ledger_entries', to='DjangoLivre.transfer', verbose_name='Transferência')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='BalanceSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('balance', DjangoLivre.models.CentsField(verbose_name='Saldo')),
+                ('last_entry_id', models.BigIntegerField(default=0, verbose_name='Último lançamento')),
+                ('taken_at', models.DateTimeField(verbose_name='Data')),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balance_snapshots', to='DjangoLivre.account', verbose_name='Conta')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='ledgerentry',
+            index=models.Index(fields=['account', 'created'], name='ledger_account_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='balancesnapshot',
+            index=models.Index(fields=['account', 'taken_at'], name='snapshot_account_taken_idx'),
+        ),
+        migrations.RunPython(backfill_ledger, migrations.RunPython.noop),
+    ]
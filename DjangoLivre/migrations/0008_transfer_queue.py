@@ -0,0 +1,36 @@
+# Generated by Django 3.2.9 on 2026-10-18 12:31
+
+import DjangoLivre.models
+from django.db import migrations, models
+import django.db.models.deletion
+import localflavor.br.models
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('DjangoLivre', '0007_ledger'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QueuedTransfer',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('source_cpf', localflavor.br.models.BRCPFField(max_length=14, verbose_name='CPF do usuário de origem')),
+                ('target_cpf', localflavor.br.models.BRCPFField(max_length=14, verbose_name='CPF do usuário de destino')),
+                ('value', DjangoLivre.models.CentsField(verbose_name='Valor')),
+                ('partition', models.PositiveSmallIntegerField(default=0, verbose_name='Partição')),
+                ('status', models.CharField(choices=[('pending', 'Na fila'), ('done', 'Realizada'), ('failed', 'Recusada')], default='pending', max_length=10)),
+                ('error', models.CharField(blank=True, max_length=255, verbose_name='Erro')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('processed', models.DateTimeField(blank=True, null=True)),
+                ('transfer', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='DjangoLivre.transfer', verbose_name='Transferência')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='queuedtransfer',
+            index=models.Index(fields=['status', 'created'], name='queued_transfer_status_idx'),
+        ),
+    ]
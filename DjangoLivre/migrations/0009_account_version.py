@@ -0,0 +1,18 @@
+# Generated by Django 3.2.9 on 2026-10-18 12:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('DjangoLivre', '0008_transfer_queue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='account',
+            name='version',
+            field=models.PositiveBigIntegerField(default=0, editable=False, verbose_name='Versão'),
+        ),
+    ]
@@ -0,0 +1,88 @@
+# Generated by Django 3.2.9 on 2026-10-18 12:36
+
+import DjangoLivre.models
+from django.db import migrations
+from django.db.models import F, Value
+from django.db.models.functions import Replace
+
+FORMATTED_CPF = r'^[0-9]{3}\.[0-9]{3}\.[0-9]{3}-[0-9]{2}$'
+
+
+def unformatted(field):
+    return Replace(Replace(F(field), Value('.'), Value('')), Value('-'), Value(''))
+
+
+def check_duplicates(Client):
+    """
+    Stops the migration, before it changes anything, when a CPF was saved both
+    formatted and with its digits only: renaming the formatted client would collide
+    with the other one, and which of the two accounts to keep is not the
+    migration's call.
+    """
+    formatted = Client.objects.filter(cpf__regex=FORMATTED_CPF).annotate(normalized=unformatted('cpf'))
+    duplicates = formatted.filter(normalized__in=Client.objects.values('cpf')).values_list('cpf', 'normalized')
+    if duplicates:
+        pairs = ', '.join(f'{cpf} e {normalized}' for cpf, normalized in duplicates)
+        raise RuntimeError(f'CPFs cadastrados duas vezes, com e sem formatação: {pairs}. Junte ou apague um '
+                           'dos clientes de cada par e rode a migração de novo.')
+
+
+def normalize_cpfs(apps, schema_editor):
+    """
+    Removes the dots and dash of the CPFs saved formatted (109.554.706-25), the
+    transfers in a single update per column. A client keeps its rows: the cpf is
+    its primary key and the key of its account, so they are renamed one by one.
+    A CPF saved both ways is reported first (see check_duplicates).
+    """
+    Client = apps.get_model('DjangoLivre', 'Client')
+    check_duplicates(Client)
+    for model_name in ('Transfer', 'QueuedTransfer'):
+        model = apps.get_model('DjangoLivre', model_name)
+        for field in ('source_cpf', 'target_cpf'):
+            model.objects.filter(**{f'{field}__regex': FORMATTED_CPF}).update(**{field: unformatted(field)})
+
+    Account = apps.get_model('DjangoLivre', 'Account')
+    related = [apps.get_model('DjangoLivre', model_name).objects
+               for model_name in ('AccountDailyStats', 'LedgerEntry', 'BalanceSnapshot')]
+    for cpf in list(Client.objects.filter(cpf__regex=FORMATTED_CPF).values_list('cpf', flat=True)):
+        normalized = cpf.replace('.', '').replace('-', '')
+        Client.objects.filter(cpf=cpf).update(cpf=normalized)
+        Account.objects.filter(account_user_id=cpf).update(account_user_id=normalized)
+        for objects in related:
+            objects.filter(account_id=cpf).update(account_id=normalized)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('DjangoLivre', '0009_account_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_cpfs, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='client',
+            name='cpf',
+            field=DjangoLivre.models.CPFField(help_text='Formato: 00011122233', max_length=14, primary_key=True, serialize=False, verbose_name='CPF '),
+        ),
+        migrations.AlterField(
+            model_name='queuedtransfer',
+            name='source_cpf',
+            field=DjangoLivre.models.CPFField(max_length=14, verbose_name='CPF do usuário de origem'),
+        ),
+        migrations.AlterField(
+            model_name='queuedtransfer',
+            name='target_cpf',
+            field=DjangoLivre.models.CPFField(max_length=14, verbose_name='CPF do usuário de destino'),
+        ),
+        migrations.AlterField(
+            model_name='transfer',
+            name='source_cpf',
+            field=DjangoLivre.models.CPFField(max_length=14, verbose_name='CPF do usuário de origem'),
+        ),
+        migrations.AlterField(
+            model_name='transfer',
+            name='target_cpf',
+            field=DjangoLivre.models.CPFField(max_length=14, verbose_name='CPF do usuário de destino'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 3.2.9 on 2026-10-18 12:42
+
+import DjangoLivre.models
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('DjangoLivre', '0010_normalize_cpf'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TransferIntent',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('source_cpf', DjangoLivre.models.CPFField(max_length=14, verbose_name='CPF do usuário de origem')),
+                ('target_cpf', DjangoLivre.models.CPFField(max_length=14, verbose_name='CPF do usuário de destino')),
+                ('value', DjangoLivre.models.CentsField(verbose_name='Valor')),
+                ('status', models.CharField(choices=[('prepared', 'Debitada'), ('credited', 'Creditada'), ('committed', 'Concluída'), ('aborted', 'Desfeita')], default='prepared', max_length=10)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('transfer', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='DjangoLivre.transfer', verbose_name='Transferência')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='transferintent',
+            index=models.Index(fields=['status', 'created'], name='transfer_intent_status_idx'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 3.2.9 on 2026-10-18 12:50
+
+import DjangoLivre.models
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('DjangoLivre', '0011_transfer_intent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BalanceBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.PositiveSmallIntegerField(verbose_name='Número')),
+                ('balance', DjangoLivre.models.CentsField(default=0, verbose_name='Saldo')),
+                ('version', models.PositiveBigIntegerField(default=0, editable=False, verbose_name='Versão')),
+            ],
+        ),
+        migrations.RemoveConstraint(
+            model_name='accountdailystats',
+            name='account_daily_stats_unique',
+        ),
+        migrations.AddField(
+            model_name='account',
+            name='bucket_count',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, verbose_name='Compartimentos'),
+        ),
+        migrations.AddField(
+            model_name='accountdailystats',
+            name='bucket',
+            field=models.PositiveSmallIntegerField(default=0, verbose_name='Compartimento'),
+        ),
+        migrations.AddConstraint(
+            model_name='accountdailystats',
+            constraint=models.UniqueConstraint(fields=('account', 'day', 'bucket'), name='account_daily_stats_unique'),
+        ),
+        migrations.AddField(
+            model_name='balancebucket',
+            name='account',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balance_buckets', to='DjangoLivre.account', verbose_name='Conta'),
+        ),
+        migrations.AddConstraint(
+            model_name='balancebucket',
+            constraint=models.UniqueConstraint(fields=('account', 'number'), name='balance_bucket_unique'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.9 on 2026-10-18 13:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('DjangoLivre', '0012_balance_buckets'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='idempotencykey',
+            name='headers',
+            field=models.JSONField(default=dict),
+        ),
+    ]
@@ -1,12 +1,44 @@
 from uuid import uuid4
 from django.db import models
-from localflavor.br.models import BRCPFField
 from phonenumber_field.modelfields import PhoneNumberField
+from .cpf import normalize_cpf, validate_cpf
+from .money import from_cents
+
+
+class CentsField(models.PositiveBigIntegerField):
+    """Amount of money, in cents (see money.py)."""
+
+
+class CPFField(models.CharField):
+    """
+    CPF stored with its 11 digits only (see cpf.py). Saved values and query values
+    are normalized, so a formatted CPF finds the same rows. max_length still fits a
+    formatted CPF, for the forms.
+    """
+    description = 'CPF Document'
+    default_validators = [validate_cpf]
+
+    def __init__(self, *args, **kwargs):
+        kwargs['max_length'] = 14
+        super().__init__(*args, **kwargs)
+
+    def to_python(self, value):
+        value = super().to_python(value)
+        return normalize_cpf(value) if isinstance(value, str) else value
+
+    def get_prep_value(self, value):
+        value = super().get_prep_value(value)
+        return normalize_cpf(value) if isinstance(value, str) else value
+
+    def pre_save(self, model_instance, add):
+        value = self.to_python(super().pre_save(model_instance, add))
+        setattr(model_instance, self.attname, value)
+        return value
 
 
 class Client(models.Model):
     name = models.CharField(max_length=255, blank=False, verbose_name='Nome')
-    cpf = BRCPFField('CPF ', blank=False, primary_key=True, help_text='Formato: 00011122233')
+    cpf = CPFField('CPF ', blank=False, primary_key=True, help_text='Formato: 00011122233')
     phone = PhoneNumberField(region='BR', blank=False, help_text='Formato DDD + Número',verbose_name='Telefone')
     email = models.EmailField(max_length=255, blank=False)
     creation = models.DateTimeField(auto_now=True)
@@ -18,22 +50,176 @@ class Client(models.Model):
 
 class Account(models.Model):
     number = models.UUIDField(default=uuid4, verbose_name='Número da Conta')
-    balance = models.PositiveIntegerField(default=5000, blank=True, verbose_name='Saldo')
+    balance = CentsField(default=500000, blank=True, verbose_name='Saldo')
     account_user = models.ForeignKey(Client, on_delete=models.CASCADE, related_name='account_user_id', editable=False, primary_key=True, verbose_name='Cliente')
+    # bumped with every change of the balance, it is the ETag of account/<cpf>/
+    version = models.PositiveBigIntegerField(default=0, editable=False, verbose_name='Versão')
+    # hot accounts keep part of the balance in BalanceBucket rows (see buckets.py)
+    bucket_count = models.PositiveSmallIntegerField(default=0, editable=False, verbose_name='Compartimentos')
 
     def __str__(self):
-        details = f'Conta: {self.number} | Saldo atual: {self.balance} '
+        details = f'Conta: {self.number} | Saldo atual: {from_cents(self.balance)} '
+        return details
+
+
+class BalanceBucket(models.Model):
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name='balance_buckets', verbose_name='Conta')
+    number = models.PositiveSmallIntegerField(verbose_name='Número')
+    balance = CentsField(default=0, verbose_name='Saldo')
+    version = models.PositiveBigIntegerField(default=0, editable=False, verbose_name='Versão')
+
+    class Meta:
+        # credited at random, so concurrent credits of a hot account lock different rows
+        constraints = [
+            models.UniqueConstraint(fields=['account', 'number'], name='balance_bucket_unique'),
+        ]
+
+    def __str__(self):
+        details = f'Conta: {self.account_id} | Compartimento: {self.number} | Saldo: {from_cents(self.balance)}'
         return details
 
 
 class Transfer(models.Model):
-    source_cpf = BRCPFField('CPF do usuário de origem', blank=False, unique=False)
-    target_cpf = BRCPFField('CPF do usuário de destino', blank=False, unique=False, )
-    value = models.FloatField(default=0, verbose_name='Valor',)
+    source_cpf = CPFField('CPF do usuário de origem', blank=False, unique=False)
+    target_cpf = CPFField('CPF do usuário de destino', blank=False, unique=False, )
+    value = CentsField(default=0, verbose_name='Valor',)
     date = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        # user histories filter by cpf and page by date (see pagination.py)
+        indexes = [
+            models.Index(fields=['source_cpf', 'date'], name='transfer_source_date_idx'),
+            models.Index(fields=['target_cpf', 'date'], name='transfer_target_date_idx'),
+            models.Index(fields=['date'], name='transfer_date_idx'),
+        ]
+
+    def __str__(self):
+        details = f'De: {self.source_cpf} | Para: {self.target_cpf} | Valor: {from_cents(self.value)} | Data: {self.date}'
+        return details
+
+
+class AccountDailyStats(models.Model):
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name='daily_stats', verbose_name='Conta')
+    day = models.DateField(verbose_name='Dia')
+    # the BalanceBucket credited, 0 for the Account row: a hot account gets one row per bucket and day
+    bucket = models.PositiveSmallIntegerField(default=0, verbose_name='Compartimento')
+    sent_count = models.PositiveIntegerField(default=0, verbose_name='Transferências enviadas')
+    sent_total = CentsField(default=0, verbose_name='Total enviado')
+    received_count = models.PositiveIntegerField(default=0, verbose_name='Transferências recebidas')
+    received_total = CentsField(default=0, verbose_name='Total recebido')
+
+    class Meta:
+        # kept up to date by the transfer engine, in the same transaction as the transfer
+        constraints = [
+            models.UniqueConstraint(fields=['account', 'day', 'bucket'], name='account_daily_stats_unique'),
+        ]
+
+    def __str__(self):
+        details = f'Conta: {self.account_id} | Dia: {self.day} | Enviado: {from_cents(self.sent_total)} | Recebido: {from_cents(self.received_total)}'
+        return details
+
+
+class IdempotencyKey(models.Model):
+    key = models.CharField(max_length=255, primary_key=True, verbose_name='Chave')
+    request_hash = models.CharField(max_length=64, verbose_name='Hash da requisição')
+    status_code = models.PositiveSmallIntegerField(default=0)
+    response = models.JSONField(null=True)
+    headers = models.JSONField(default=dict)  # the ones sent again with the response (see idempotency.py)
+    created = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        details = f'Chave: {self.key} | Status: {self.status_code} | Data: {self.created}'
+        return details
+
+
+class LedgerEntry(models.Model):
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name='ledger_entries', verbose_name='Conta')
+    transfer = models.ForeignKey(Transfer, on_delete=models.CASCADE, related_name='ledger_entries', verbose_name='Transferência')
+    amount = models.BigIntegerField(verbose_name='Valor')  # in cents, negative for the debit
+    created = models.DateTimeField(verbose_name='Data')
+
+    class Meta:
+        # append-only, written with the transfer (see ledger.py)
+        indexes = [
+            models.Index(fields=['account', 'created'], name='ledger_account_created_idx'),
+        ]
+
+    def __str__(self):
+        details = f'Conta: {self.account_id} | Valor: {from_cents(self.amount)} | Data: {self.created}'
+        return details
+
+
+class BalanceSnapshot(models.Model):
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name='balance_snapshots', verbose_name='Conta')
+    balance = CentsField(verbose_name='Saldo')
+    last_entry_id = models.BigIntegerField(default=0, verbose_name='Último lançamento')
+    taken_at = models.DateTimeField(verbose_name='Data')
+
+    class Meta:
+        # the balance after every entry of the account up to last_entry_id (see ledger.py)
+        indexes = [
+            models.Index(fields=['account', 'taken_at'], name='snapshot_account_taken_idx'),
+        ]
+
     def __str__(self):
-        details = f'De: {self.source_cpf} | Para: {self.target_cpf} | Valor: {self.value} | Data: {self.date}'
+        details = f'Conta: {self.account_id} | Saldo: {from_cents(self.balance)} | Data: {self.taken_at}'
         return details
 
 
+class QueuedTransfer(models.Model):
+    PENDING = 'pending'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(PENDING, 'Na fila'), (DONE, 'Realizada'), (FAILED, 'Recusada')]
+
+    id = models.UUIDField(primary_key=True, default=uuid4, editable=False)
+    source_cpf = CPFField('CPF do usuário de origem', blank=False, unique=False)
+    target_cpf = CPFField('CPF do usuário de destino', blank=False, unique=False)
+    value = CentsField(verbose_name='Valor')
+    partition = models.PositiveSmallIntegerField(default=0, verbose_name='Partição')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    error = models.CharField(max_length=255, blank=True, verbose_name='Erro')
+    transfer = models.ForeignKey(Transfer, on_delete=models.SET_NULL, null=True, blank=True, related_name='+', verbose_name='Transferência')
+    created = models.DateTimeField(auto_now_add=True)
+    processed = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        # the workers read the pending transfers of their partitions in order (see transfer_queue.py)
+        indexes = [
+            models.Index(fields=['status', 'created'], name='queued_transfer_status_idx'),
+        ]
+
+    def __str__(self):
+        details = f'De: {self.source_cpf} | Para: {self.target_cpf} | Valor: {from_cents(self.value)} | Status: {self.status}'
+        return details
+
+
+class TransferIntent(models.Model):
+    """
+    A transfer between accounts of different shards (see services.execute_transfer_across_shards).
+    The source shard has it as prepared, then committed or aborted; the target shard
+    has it, with the same id, once the target account was credited.
+    """
+    PREPARED = 'prepared'
+    CREDITED = 'credited'
+    COMMITTED = 'committed'
+    ABORTED = 'aborted'
+    STATUS_CHOICES = [(PREPARED, 'Debitada'), (CREDITED, 'Creditada'), (COMMITTED, 'Concluída'), (ABORTED, 'Desfeita')]
+
+    id = models.UUIDField(primary_key=True, default=uuid4, editable=False)
+    source_cpf = CPFField('CPF do usuário de origem', blank=False, unique=False)
+    target_cpf = CPFField('CPF do usuário de destino', blank=False, unique=False)
+    value = CentsField(verbose_name='Valor')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PREPARED)
+    transfer = models.ForeignKey(Transfer, on_delete=models.SET_NULL, null=True, blank=True, related_name='+', verbose_name='Transferência')
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        # `manage.py settle_transfers` looks for the prepared ones left behind
+        indexes = [
+            models.Index(fields=['status', 'created'], name='transfer_intent_status_idx'),
+        ]
+
+    def __str__(self):
+        details = f'De: {self.source_cpf} | Para: {self.target_cpf} | Valor: {from_cents(self.value)} | Status: {self.status}'
+        return details
@@ -0,0 +1,39 @@
+"""
+Money is stored as a whole number of cents (centavos) in every model, so balances
+and totals are added and compared as integers, in SQL, without rounding. The API
+keeps showing and accepting reais: 1050 cents <-> 10.5
+"""
+from decimal import Decimal, DecimalException
+
+CENTS = 100
+# the largest amount the API accepts (10 trillion reais), far from the 2**63 - 1 of the
+# bigint columns, so adding it to a balance or to a daily total can not overflow them
+MAX_CENTS = 10 ** 15
+# amounts from 10**MAX_DIGITS reais on are refused before they are converted at all:
+# no column holds them, and int() of an exponent like 1e999990 takes seconds
+MAX_DIGITS = 18
+
+
+def to_cents(value):
+    """
+    Converts an amount in reais (10.5, '10.50', 10) to cents. Raises ValueError for
+    anything that is not a finite amount with at most 2 decimal places, or that has
+    more than MAX_DIGITS digits before the decimal point.
+    """
+    if isinstance(value, bool):
+        raise ValueError(value)
+    try:
+        amount = Decimal(str(value).strip())
+        if not amount.is_finite() or amount.adjusted() >= MAX_DIGITS or (amount and amount.adjusted() < -2):
+            raise ValueError(value)
+        cents = amount * CENTS
+    except DecimalException:
+        raise ValueError(value)
+    if cents != cents.to_integral_value():
+        raise ValueError(value)
+    return int(cents)
+
+
+def from_cents(cents):
+    """Converts cents back to reais, the unit shown by the API."""
+    return cents / CENTS
@@ -0,0 +1,136 @@
+"""
+Bulk import of clients, used by the create-users/batch/ endpoint and by
+`manage.py import_clients`.
+
+Every row is checked in a single pass with validators built once, then the valid
+rows are inserted with bulk_create in chunks, one transaction per chunk, together
+with their accounts. A row that can not be imported is reported, it does not stop
+the import.
+"""
+import csv
+import io
+from django.core.exceptions import ValidationError
+from django.core.validators import EmailValidator
+from django.db import IntegrityError, transaction
+from phonenumber_field.phonenumber import PhoneNumber
+from phonenumbers import NumberParseException
+from .cpf import validate_cpf
+from .models import Client, Account
+from .sharding import split_by_shard, using_shard
+
+FIELDS = ('cpf', 'name', 'phone', 'email')
+CHUNK_SIZE = 1000
+
+
+def decode_csv(content, encoding=None):
+    """
+    The text of a CSV file, decoded with encoding or, when it is not given, as UTF-8
+    and else as Windows-1252, the encoding of the CSV files saved by Excel in Brazil.
+    Raises ValueError, with a message for the user, when it can not be decoded.
+    """
+    if isinstance(content, str):
+        return content
+    try:
+        if encoding:
+            return content.decode(encoding)
+        try:
+            return content.decode('utf-8-sig')
+        except UnicodeDecodeError:
+            return content.decode('cp1252')
+    except (UnicodeDecodeError, LookupError):
+        raise ValueError(f'O arquivo CSV não está codificado em {encoding or "UTF-8 ou Windows-1252"}')
+
+
+def read_csv(content, encoding=None):
+    """
+    (line, row) pairs of a CSV with the header cpf,name,phone,email. The file is
+    decoded at once (see decode_csv), so a ValueError is raised here, not when the rows
+    are read.
+    """
+    reader = csv.DictReader(io.StringIO(decode_csv(content, encoding)))
+    return ((reader.line_num, row) for row in reader)
+
+
+def validate_rows(rows):
+    """
+    Checks (line, row) pairs and returns (clients, rejected): the Client instances
+    to create and, for every other row, a dict with its line, cpf and errors.
+    """
+    validate_email = EmailValidator()
+    name_length = Client._meta.get_field('name').max_length
+    clients, rejected, seen = [], [], set()
+
+    for line, row in rows:
+        if not isinstance(row, dict):
+            rejected.append({'linha': line, 'cpf': None, 'erros': ['Linha inválida']})
+            continue
+        cpf, name, phone, email = (str(row.get(field) or '').strip() for field in FIELDS)
+        errors = []
+        if not cpf.isalnum():
+            errors.append('O CPF deve ser sem ponto e traço')
+        else:
+            try:
+                validate_cpf(cpf)
+            except ValidationError:
+                errors.append('CPF inválido')
+        if cpf in seen:
+            errors.append('CPF repetido no arquivo')
+        if not name or len(name) > name_length:
+            errors.append('Nome inválido')
+        try:
+            phone_number = PhoneNumber.from_string(phone, region='BR')
+        except NumberParseException:
+            phone_number = None
+        if phone_number is None or not phone_number.is_valid():
+            errors.append('Telefone inválido')
+        try:
+            validate_email(email)
+        except ValidationError:
+            errors.append('E-mail inválido')
+
+        if errors:
+            rejected.append({'linha': line, 'cpf': cpf, 'erros': errors})
+        else:
+            seen.add(cpf)
+            clients.append((line, Client(cpf=cpf, name=name, phone=phone_number, email=email)))
+    return clients, rejected
+
+
+def registered_cpfs(cpfs):
+    """The cpfs of the list that already have a client."""
+    return set(Client.objects.filter(cpf__in=cpfs).values_list('cpf', flat=True))
+
+
+def import_clients(rows, chunk_size=CHUNK_SIZE, attempts=3):
+    """
+    Imports (line, row) pairs and returns (created, rejected), the number of clients
+    created and the rows that were not, as in validate_rows. Each chunk is its own
+    transaction, so a large import does not hold one long transaction, and the
+    clients of each shard (see sharding.py) are inserted in their shard.
+
+    A client created by someone else between the check of a chunk and its insert
+    makes the insert fail; the chunk is then checked and inserted again, up to
+    attempts times.
+    """
+    clients, rejected = validate_rows(rows)
+    created = 0
+    for db, shard_clients in split_by_shard(clients, lambda item: item[1].cpf):
+        with using_shard(db):
+            for start in range(0, len(shard_clients), chunk_size):
+                chunk = shard_clients[start:start + chunk_size]
+                for attempt in range(attempts):
+                    try:
+                        with transaction.atomic(using=db):
+                            existing = registered_cpfs([client.cpf for _, client in chunk])
+                            new = [client for _, client in chunk if client.cpf not in existing]
+                            Client.objects.bulk_create(new)
+                            Account.objects.bulk_create([Account(account_user_id=client.cpf) for client in new])
+                        break
+                    except IntegrityError:
+                        if attempt == attempts - 1:
+                            raise
+                rejected.extend({'linha': line, 'cpf': client.cpf, 'erros': ['CPF já cadastrado']}
+                                for line, client in chunk if client.cpf in existing)
+                created += len(new)
+    rejected.sort(key=lambda row: row['linha'])
+    return created, rejected
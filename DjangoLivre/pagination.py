@@ -0,0 +1,127 @@
+"""
+Keyset (cursor) pagination for the transfer lists.
+"""
+import base64
+import binascii
+from datetime import datetime
+from itertools import islice
+from django.conf import settings
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+from .sharding import gather, merge
+
+
+class TransferKeysetPagination(BasePagination):
+    """
+    Pages through transfers ordered by (date, id).
+
+    The position of the last transfer of a page is encoded into an opaque cursor and
+    the next page is read with WHERE (date, id) > cursor, so a deep page costs the
+    same as the first one (an OFFSET would have to skip every previous row). The
+    link to the next page is sent on the Link header, which keeps the body of the
+    existing endpoints unchanged.
+
+    The page size comes from the TRANSFERS_PAGE_SIZE setting and can be changed per
+    request with ?page_size=, up to TRANSFERS_MAX_PAGE_SIZE. ?ordering=-date pages
+    from the newest transfer back.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    ordering_query_param = 'ordering'
+    invalid_cursor_message = 'Cursor inválido'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.start(request)
+        return self.finish(list(self.page_queryset(queryset)[:self.page_size + 1]))
+
+    def paginate_shards(self, get_queryset, request, view=None):
+        """
+        paginate_queryset over every shard (see sharding.py): the page is read from the
+        get_queryset() of each shard and the pages are merged by (date, id).
+        """
+        self.start(request)
+        pages = gather(lambda db: list(self.page_queryset(get_queryset())[:self.page_size + 1]))
+        return self.finish(list(islice(merge(pages, key=self.get_position, reverse=self.descending),
+                                       self.page_size + 1)))
+
+    def start(self, request):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.descending = self.get_descending(request)
+        self.position = self.decode_cursor(request)
+
+    def page_queryset(self, queryset):
+        """The queryset in page order, after the cursor."""
+        if self.descending:
+            queryset = queryset.order_by('-date', '-id')
+        else:
+            queryset = queryset.order_by('date', 'id')
+        if self.position is not None:
+            date, pk = self.position
+            if self.descending:
+                queryset = queryset.filter(Q(date__lt=date) | Q(date=date, id__lt=pk))
+            else:
+                queryset = queryset.filter(Q(date__gt=date) | Q(date=date, id__gt=pk))
+        return queryset
+
+    def finish(self, page):
+        """Keeps page_size rows of the page_size + 1 read, the extra one tells if there is a next page."""
+        self.has_next = len(page) > self.page_size
+        page = page[:self.page_size]
+        self.next_position = self.get_position(page[-1]) if self.has_next else None
+        return page
+
+    def get_position(self, transfer):
+        # pages of values() (see RowSerializer) hold dicts
+        if isinstance(transfer, dict):
+            return transfer['date'], transfer['id']
+        return transfer.date, transfer.id
+
+    def get_paginated_response(self, data):
+        return Response(data, headers=self.get_headers())
+
+    def get_headers(self):
+        """The Link header to the next page, for responses that are not built by DRF."""
+        next_link = self.get_next_link()
+        if next_link is None:
+            return {}
+        return {'Link': f'<{next_link}>; rel="next"'}
+
+    def get_descending(self, request):
+        ordering = request.GET.get(self.ordering_query_param, 'date')
+        if ordering not in ('date', '-date'):
+            raise ValidationError({'error': f'Ordenação inválida: {ordering}'})
+        return ordering == '-date'
+
+    def get_page_size(self, request):
+        max_page_size = settings.TRANSFERS_MAX_PAGE_SIZE
+        try:
+            page_size = int(request.GET[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return settings.TRANSFERS_PAGE_SIZE
+        if page_size <= 0:
+            return settings.TRANSFERS_PAGE_SIZE
+        return min(page_size, max_page_size)
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.next_position))
+
+    def encode_cursor(self, position):
+        date, pk = position
+        return base64.urlsafe_b64encode(f'{date.isoformat()}|{pk}'.encode()).decode()
+
+    def decode_cursor(self, request):
+        cursor = request.GET.get(self.cursor_query_param)
+        if not cursor:
+            return None
+        try:
+            date, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+            return datetime.fromisoformat(date), int(pk)
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
@@ -0,0 +1,32 @@
+"""
+JSON renderer backed by orjson, when it is installed (`pip install orjson`).
+"""
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    Writes the same compact UTF-8 JSON as DRF's JSONRenderer, several times faster on
+    large lists. Without orjson, for an indented response (?indent= in the Accept header)
+    or for data orjson can not encode (e.g. Decimal or lazy strings), it falls back to
+    JSONRenderer.
+
+    One difference is left: NaN and Infinity are written as null, where JSONRenderer
+    refuses them with a ValueError. The API does not produce them, its amounts come
+    from whole cents.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data)
+        except TypeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # escaped by JSONRenderer too, as they end a line in JavaScript
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
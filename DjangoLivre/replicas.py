@@ -0,0 +1,133 @@
+"""
+Read replicas of 'default' (DATABASE_REPLICAS) for the list and history views.
+
+The views with replica_reads = True (all-users/, all-accounts/, all-transfers/ and
+the transfer histories) answer GET requests from a replica, so the primary is left
+with the writes and the lookups of a single row. ReplicaMiddleware picks the replica
+per request, in turn (REPLICA_SELECTION = 'round_robin') or the least behind
+('least_lag'), and leaves out the replicas more than REPLICA_MAX_LAG seconds behind;
+with none left the request reads from the primary.
+
+A replica may not have the last writes yet, so a client that wrote something (any
+successful POST, PUT, PATCH or DELETE) gets a cookie that keeps its reads on the
+primary for REPLICA_PIN_SECONDS: it always sees its own writes.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from itertools import count
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from .sharding import current_shard
+
+PIN_COOKIE = 'livre_primary'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_current_replica = ContextVar('current_replica', default=None)
+_turn = count()
+_lags = {}
+_lags_lock = threading.Lock()
+
+
+def replicas():
+    return settings.DATABASE_REPLICAS
+
+
+def measure_lag(alias):
+    """Seconds the replica is behind its primary; 0 when the database can not tell."""
+    connection = connections[alias]
+    if connection.vendor != 'postgresql':
+        return 0.0
+    with connection.cursor() as cursor:
+        # NULL on an idle replica that replayed everything, or on a primary
+        cursor.execute('SELECT EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())')
+        lag = cursor.fetchone()[0]
+    return max(float(lag or 0), 0.0)
+
+
+def replica_lag(alias):
+    """measure_lag, measured at most once every REPLICA_LAG_CHECK_INTERVAL seconds per replica."""
+    now = time.monotonic()
+    with _lags_lock:
+        checked = _lags.get(alias)
+    if checked is not None and now - checked[0] < settings.REPLICA_LAG_CHECK_INTERVAL:
+        return checked[1]
+    try:
+        lag = measure_lag(alias)
+    except DatabaseError:
+        # unreachable: left out until the next check
+        lag = float('inf')
+    with _lags_lock:
+        _lags[alias] = (now, lag)
+    return lag
+
+
+def choose_replica():
+    """The replica for the next read-only request, or None to read from the primary."""
+    aliases = replicas()
+    if not aliases:
+        return None
+    if settings.REPLICA_SELECTION == 'least_lag':
+        candidates = sorted(aliases, key=replica_lag)
+    else:
+        turn = next(_turn) % len(aliases)
+        candidates = aliases[turn:] + aliases[:turn]
+    for alias in candidates:
+        if replica_lag(alias) <= settings.REPLICA_MAX_LAG:
+            return alias
+    return None
+
+
+@contextmanager
+def using_replica(alias):
+    """Sends the reads of the block to the replica `alias` (None: to the primary)."""
+    token = _current_replica.set(alias)
+    try:
+        yield alias
+    finally:
+        _current_replica.reset(token)
+
+
+def current_replica():
+    """The replica set by using_replica() or ReplicaMiddleware, None for the primary."""
+    return _current_replica.get()
+
+
+def set_current_replica(alias):
+    """Makes `alias` the current replica until the enclosing using_replica() block ends."""
+    _current_replica.set(alias)
+
+
+class ReplicaRouter:
+    """
+    Sends the reads to the current replica. Only the reads that would go to
+    'default' move: with sharded accounts (see sharding.py), the ones of the other
+    shards stay where ShardRouter sends them.
+    """
+
+    def db_for_read(self, model, **hints):
+        alias = _current_replica.get()
+        if alias is None:
+            return None
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db not in (None, DEFAULT_DB_ALIAS, alias):
+            return None
+        if current_shard() not in (None, DEFAULT_DB_ALIAS):
+            return None
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        primary = {DEFAULT_DB_ALIAS, *replicas()}
+        if obj1._state.db in primary and obj2._state.db in primary:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # the replicas get their tables from the primary
+        if db in replicas():
+            return False
+        return None
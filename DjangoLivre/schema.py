@@ -0,0 +1,147 @@
+"""
+The OpenAPI schema of the API (swagger.json and swagger.yaml, also read by the
+swagger/ and redoc/ pages), built once instead of on every request.
+
+`manage.py build_schema` writes it to OPENAPI_SCHEMA_FILE at build time, together
+with the fingerprint of what it was built from: the routes of the URLconf and the
+source of the modules of their views, serializers and models. Each process loads
+that file on the first request for the schema, and only builds the schema again, in
+memory, when the fingerprint does not match its own (a route, a view or a serializer
+changed since the file was written). The schema is served with a strong ETag, the hash of its bytes, and with
+Cache-Control max-age OPENAPI_SCHEMA_MAX_AGE, so the clients that poll it get a 304
+or nothing at all.
+"""
+import hashlib
+import inspect
+import json
+import sys
+import threading
+from collections import OrderedDict
+from django.conf import settings
+from django.http import HttpResponse
+from django.urls import URLResolver, get_resolver
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition, require_safe
+from drf_yasg import openapi
+from drf_yasg.codecs import OpenAPICodecJson, yaml_sane_dump
+from drf_yasg.generators import OpenAPISchemaGenerator
+
+API_INFO = openapi.Info(
+    title="Snippets API",
+    default_version='v1',
+    description="Test description",
+    terms_of_service="https://www.google.com/policies/terms/",
+    contact=openapi.Contact(email="contact@snippets.local"),
+    license=openapi.License(name="BSD License"),
+)
+FINGERPRINT_KEY = 'x-urlconf-fingerprint'
+
+_schema = {}
+_schema_lock = threading.Lock()
+
+
+def _routes(patterns, prefix=''):
+    for pattern in patterns:
+        route = prefix + str(pattern.pattern)
+        if isinstance(pattern, URLResolver):
+            yield from _routes(pattern.url_patterns, route)
+            continue
+        view = pattern.callback
+        view = getattr(view, 'view_class', None) or getattr(view, 'cls', None) or view
+        yield route, view, pattern.name
+
+
+def _schema_modules(view):
+    """The modules the schema of a view is built from: its own, its serializer's and its model's."""
+    serializer = getattr(view, 'serializer_class', None)
+    model = getattr(getattr(serializer, 'Meta', None), 'model', None)
+    return {item.__module__ for item in (view, serializer, model) if item is not None}
+
+
+def _source(module):
+    try:
+        return inspect.getsource(sys.modules[module]).encode()
+    except (KeyError, OSError, TypeError):
+        return b''
+
+
+def urlconf_fingerprint(urlconf=None):
+    """
+    Hash of the routes of the URLconf, of the views they lead to and of the source of
+    the modules of those views, their serializers and models (see _schema_modules).
+    """
+    fingerprint = hashlib.sha256()
+    modules = set()
+    for route, view, name in _routes(get_resolver(urlconf).url_patterns):
+        fingerprint.update(f'{route} {view.__module__}.{view.__qualname__} {name}\n'.encode())
+        modules |= _schema_modules(view)
+    for module in sorted(modules):
+        fingerprint.update(module.encode() + b'\n' + _source(module))
+    return fingerprint.hexdigest()
+
+
+def generate_schema():
+    """Builds the schema of every route of the URLconf, as the bytes of swagger.json."""
+    schema = OpenAPISchemaGenerator(API_INFO).get_schema(request=None, public=True)
+    schema[FINGERPRINT_KEY] = urlconf_fingerprint()
+    return OpenAPICodecJson(validators=[]).encode(schema)
+
+
+def write_schema(path=None):
+    """generate_schema() into path (default: OPENAPI_SCHEMA_FILE); returns the path."""
+    path = path or settings.OPENAPI_SCHEMA_FILE
+    with open(path, 'wb') as file:
+        file.write(generate_schema())
+    return path
+
+
+def _load():
+    try:
+        with open(settings.OPENAPI_SCHEMA_FILE, 'rb') as file:
+            data = file.read()
+        if json.loads(data).get(FINGERPRINT_KEY) == urlconf_fingerprint():
+            return data
+    except (OSError, ValueError):
+        pass
+    # no file, or one built for other routes
+    return generate_schema()
+
+
+def get_schema(extension='.json'):
+    """(bytes, etag) of the schema as swagger.json or, with extension '.yaml', as swagger.yaml."""
+    with _schema_lock:
+        if '.json' not in _schema:
+            data = _load()
+            _schema['.json'] = data, hashlib.sha256(data).hexdigest()
+        if extension not in _schema:
+            data = yaml_sane_dump(json.loads(_schema['.json'][0], object_pairs_hook=OrderedDict), binary=True)
+            _schema[extension] = data, hashlib.sha256(data).hexdigest()
+        return _schema[extension]
+
+
+def clear_schema():
+    """Forgets the schema loaded by this process; the next request loads it again."""
+    with _schema_lock:
+        _schema.clear()
+
+
+@condition(etag_func=lambda request, format: get_schema(format)[1])
+def _schema_response(request, format):
+    content_type = 'application/yaml' if format == '.yaml' else 'application/json'
+    return HttpResponse(get_schema(format)[0], content_type=f'{content_type}; charset=utf-8')
+
+
+@require_safe
+def openapi_schema(request, format):
+    """
+    It expects:
+        - GET as http method;
+        - url/swagger.json or url/swagger.yaml
+        - Optional: If-None-Match with the ETag of a previous response
+    It returns:
+        - HTTP status = 200 with the OpenAPI schema and an ETag, or 304 when the
+          schema did not change, both with Cache-Control max-age.
+    """
+    response = _schema_response(request, format)
+    patch_cache_control(response, public=True, max_age=settings.OPENAPI_SCHEMA_MAX_AGE)
+    return response
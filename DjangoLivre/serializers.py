@@ -1,20 +1,227 @@
+from datetime import date
+from functools import partial
+from django.db import models
+from django.db.models import QuerySet
+from django.utils import timezone
+from phonenumber_field.modelfields import PhoneNumberField
+from phonenumber_field.phonenumber import to_python as phone_to_python
 from rest_framework import serializers
-from .models import Client, Account, Transfer
+from rest_framework.utils import model_meta
+from .buckets import with_buckets
+from .cpf import normalize_cpf
+from .models import Client, Account, Transfer, AccountDailyStats, QueuedTransfer, CentsField, CPFField
+from .money import MAX_CENTS, to_cents, from_cents
+from .timing import serializing
 
 
-class ClientSerializer(serializers.ModelSerializer):
+class MoneyField(serializers.Field):
+    """
+    Amount of money stored in cents and shown in reais (see money.py).
+    min_value and max_value are in cents too.
+    """
+    default_error_messages = {
+        'invalid': 'Informe um valor válido, com no máximo 2 casas decimais.',
+        'min_value': 'O valor deve ser de pelo menos {min_value}.',
+        'max_value': 'O valor deve ser de no máximo {max_value}.',
+    }
+
+    def __init__(self, min_value=None, max_value=None, **kwargs):
+        self.min_value = min_value
+        self.max_value = max_value
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        try:
+            cents = to_cents(data)
+        except ValueError:
+            self.fail('invalid')
+        if self.min_value is not None and cents < self.min_value:
+            self.fail('min_value', min_value=from_cents(self.min_value))
+        if self.max_value is not None and cents > self.max_value:
+            self.fail('max_value', max_value=from_cents(self.max_value))
+        return cents
+
+    def to_representation(self, value):
+        return from_cents(value)
+
+
+class CPFSerializerField(serializers.CharField):
+    """CPF accepted with or without its dots and dash, validated in the stored format (see cpf.py)."""
+
+    def to_internal_value(self, data):
+        return normalize_cpf(super().to_internal_value(data))
+
+
+class ModelSerializer(serializers.ModelSerializer):
+    """ModelSerializer that also knows the CentsField and CPFField of our models."""
+    serializer_field_mapping = {**serializers.ModelSerializer.serializer_field_mapping, CentsField: MoneyField,
+                                CPFField: CPFSerializerField}
+
+    def to_representation(self, instance):
+        # charged to the serializer time of the request (see timing.py); with many=True
+        # it runs, and is charged, once per item
+        with serializing():
+            return super().to_representation(instance)
+
+
+class ClientSerializer(ModelSerializer):
     class Meta:
         model = Client
         fields = '__all__'
 
 
-class AccountSerializer(serializers.ModelSerializer):
+class AccountSerializer(ModelSerializer):
     class Meta:
         model = Account
-        fields = '__all__'
+        exclude = ('version', 'bucket_count')
 
 
-class TransferSerializer(serializers.ModelSerializer):
+class TransferSerializer(ModelSerializer):
     class Meta:
         model = Transfer
         fields = '__all__'
+        extra_kwargs = {'value': {'min_value': 1, 'max_value': MAX_CENTS}}
+
+
+class QueuedTransferSerializer(ModelSerializer):
+    class Meta:
+        model = QueuedTransfer
+        exclude = ('partition',)
+
+
+class AccountDailyStatsSerializer(ModelSerializer):
+    class Meta:
+        model = AccountDailyStats
+        fields = ('day', 'sent_count', 'sent_total', 'received_count', 'received_total')
+
+
+def datetime_to_representation(value, tz=None):
+    """
+    Same output as the DateTimeField of the serializers above (ISO 8601 in the current
+    timezone, or in tz, 'Z' for UTC), without building a serializer field.
+    """
+    if timezone.is_aware(value):
+        value = timezone.localtime(value, tz)
+    value = value.isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
+
+
+class RowSerializer:
+    """
+    Read-only serializer for lists, with the same output as a ModelSerializer with
+    fields = '__all__' (or with exclude). The rows are read with values() and only the columns that need
+    it are converted, by a function picked once per model field, so no model instance
+    or DRF field is created per row.
+
+    Use it on a queryset of the model, or on the dicts of values(*get_fields()) (e.g. a
+    page of them), or for rows(), on the tuples of values_list(*get_fields()):
+
+        TransferRowSerializer(Transfer.objects.all()).data
+    """
+    model = None
+    fields = None
+    exclude = ()
+    column_converters = {
+        CentsField: from_cents,
+        models.DateField: date.isoformat,
+        models.UUIDField: str,
+    }
+
+    def __init__(self, instance, chunk_size=2000):
+        self.instance = instance
+        self.chunk_size = chunk_size
+
+    @classmethod
+    def get_fields(cls):
+        """The fields in the order ModelSerializer puts them for '__all__', less exclude."""
+        if cls.fields is None:
+            info = model_meta.get_field_info(cls.model)
+            cls.fields = tuple(name for name in (info.pk.name, *info.fields, *info.forward_relations)
+                               if name not in cls.exclude)
+        return cls.fields
+
+    @classmethod
+    def get_converters(cls):
+        """(field, function) for the fields whose values are not JSON-ready already."""
+        converters = []
+        for name in cls.get_fields():
+            convert = cls.get_converter(cls.model._meta.get_field(name))
+            if convert is not None:
+                converters.append((name, convert))
+        return converters
+
+    @classmethod
+    def get_converter(cls, field):
+        if isinstance(field, models.DateTimeField):
+            # looked up once instead of on every row
+            return partial(datetime_to_representation, tz=timezone.get_current_timezone())
+        if isinstance(field, PhoneNumberField):
+            # values() has the number as stored (PHONENUMBER_DB_FORMAT); the model
+            # attribute, which ModelSerializer shows, is parsed with the field's region
+            region = field.region
+            return lambda value: str(phone_to_python(value, region=region))
+        for field_class in type(field).__mro__:
+            if field_class in cls.column_converters:
+                return cls.column_converters[field_class]
+        return None
+
+    @classmethod
+    def values(cls, queryset):
+        return queryset.values(*cls.get_fields())
+
+    @property
+    def data(self):
+        with serializing():
+            rows = self.values(self.instance) if isinstance(self.instance, QuerySet) else self.instance
+            converters = self.get_converters()
+            data = []
+            for row in rows:
+                for name, convert in converters:
+                    value = row[name]
+                    if value is not None:
+                        row[name] = convert(value)
+                data.append(row)
+            return data
+
+    def rows(self):
+        """
+        Yields one tuple of JSON-ready values per row, in the order of the fields. The
+        rows are read in chunks, so memory does not grow with the size of the queryset.
+        """
+        fields = self.get_fields()
+        converters = dict(self.get_converters())
+        converters = [converters.get(field) for field in fields]
+        rows = self.instance
+        if isinstance(rows, QuerySet):
+            rows = rows.values_list(*fields).iterator(chunk_size=self.chunk_size)
+        for row in rows:
+            yield tuple(value if convert is None or value is None else convert(value)
+                        for convert, value in zip(converters, row))
+
+    def dicts(self):
+        fields = self.get_fields()
+        for row in self.rows():
+            yield dict(zip(fields, row))
+
+
+class ClientRowSerializer(RowSerializer):
+    model = Client
+
+
+class AccountRowSerializer(RowSerializer):
+    model = Account
+    exclude = ('version', 'bucket_count')
+
+    @classmethod
+    def values(cls, queryset):
+        # the balance of an account includes its buckets (see buckets.py)
+        rows = list(with_buckets(queryset).values(*cls.get_fields(), 'bucket_balance'))
+        for row in rows:
+            row['balance'] += row.pop('bucket_balance')
+        return rows
+
+
+class TransferRowSerializer(RowSerializer):
+    model = Transfer
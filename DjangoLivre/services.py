@@ -0,0 +1,390 @@
+"""
+Business operations that touch more than one row. The views validate the input and
+translate the errors raised here into HTTP responses.
+"""
+from collections import defaultdict
+from datetime import timedelta
+from itertools import chain
+from django.db import IntegrityError, connections, router, transaction
+from django.db.models import F
+from django.utils import timezone
+from .buckets import bucket_balances, credit_bucket, debit_buckets
+from .cache import invalidate
+from .ledger import record_entries
+from .models import Account, AccountDailyStats, BalanceBucket, Transfer, TransferIntent
+from .sharding import gather, shard_for, split_by_shard, using_shard
+
+
+class TransferError(Exception):
+    """Base class for the transfers that can not be performed."""
+
+
+class SameAccountError(TransferError):
+    pass
+
+
+class InsufficientFundsError(TransferError):
+    pass
+
+
+class AccountNotFoundError(TransferError, Account.DoesNotExist):
+    pass
+
+
+# what the API answers for each refused transfer
+ERROR_MESSAGES = {
+    InsufficientFundsError: "O saldo da conta de origem deve ser maior que o valor da transferência",
+    SameAccountError: "Os usuários de destino e origem devem ser diferentes",
+    AccountNotFoundError: "Conta não encontrada",
+}
+
+
+def lock_accounts(cpfs):
+    """
+    Locks the accounts of the given cpfs (SELECT ... FOR UPDATE) and returns them
+    in a dict keyed by cpf. The rows are always locked in cpf order, so two
+    transfers between the same accounts can never wait on each other (deadlock).
+    Must be called inside a transaction.
+    """
+    accounts = Account.objects.select_for_update().filter(account_user__in=set(cpfs)).order_by('account_user')
+    return {account.account_user_id: account for account in accounts}
+
+
+def debit_account(cpf, value):
+    """
+    Takes value (in cents) from the Account row of cpf. Returns False when only the
+    account's buckets (see buckets.py) can pay it: its row is then locked, and
+    debit_buckets must follow once the other Account rows are written. Raises
+    InsufficientFundsError or AccountNotFoundError.
+    """
+    debited = Account.objects.filter(account_user=cpf, balance__gte=value)
+    if debited.update(balance=F('balance') - value, version=F('version') + 1):
+        return True
+    if not Account.objects.select_for_update().filter(account_user=cpf).exists():
+        raise AccountNotFoundError(cpf)
+    if not BalanceBucket.objects.filter(account_id=cpf).exists():
+        raise InsufficientFundsError(cpf)
+    return False
+
+
+def credit_account(cpf, value):
+    """
+    Adds value (in cents) to the Account row of cpf. Returns False for an account with
+    buckets, whose credits go to credit_bucket once the other Account rows are written.
+    Raises AccountNotFoundError.
+    """
+    if Account.objects.filter(account_user=cpf, bucket_count=0).update(balance=F('balance') + value,
+                                                                      version=F('version') + 1):
+        return True
+    if not Account.objects.filter(account_user=cpf).exists():
+        raise AccountNotFoundError(cpf)
+    return False
+
+
+def move_buckets(changes):
+    """
+    Applies the changes ({cpf: value in cents, negative for a debit}) that debit_account
+    and credit_account left to the buckets, in cpf order, after every Account row. Returns
+    {cpf: number of the bucket credited}, for record_daily_stats.
+    """
+    credited = {}
+    for cpf, change in sorted(changes.items()):
+        if change < 0:
+            if not debit_buckets(cpf, -change):
+                raise InsufficientFundsError(cpf)
+            continue
+        credited[cpf] = credit_bucket(cpf, change)
+    return credited
+
+
+def set_bucket_count(cpf, count):
+    """
+    Spreads the credits of the account over count buckets (0: back to the Account row
+    only). The money of the buckets beyond count goes back to the Account row. Raises
+    Account.DoesNotExist.
+    """
+    with transaction.atomic(using=router.db_for_write(Account)):
+        Account.objects.select_for_update().get(account_user=cpf)
+        BalanceBucket.objects.bulk_create([BalanceBucket(account_id=cpf, number=number)
+                                           for number in range(1, count + 1)], ignore_conflicts=True)
+        retired = list(BalanceBucket.objects.select_for_update().filter(account_id=cpf, number__gt=count)
+                       .order_by('number'))
+        moved = sum(bucket.balance for bucket in retired)
+        BalanceBucket.objects.filter(pk__in=[bucket.pk for bucket in retired if bucket.balance]).update(
+            balance=0, version=F('version') + 1)
+        Account.objects.filter(account_user=cpf).update(balance=F('balance') + moved, version=F('version') + 1,
+                                                        bucket_count=count)
+        invalidate(cpf)
+
+
+def execute_transfer(source_cpf, target_cpf, value):
+    """
+    Moves value (in cents) from the source account to the target account and
+    records the Transfer, all in a single transaction.
+
+    The balances are changed by the database itself (UPDATE ... SET balance =
+    balance - value WHERE balance >= value), so concurrent transfers can not
+    overwrite each other, and the two rows are written in cpf order, so two
+    transfers between the same accounts always lock them in the same order.
+    Transfers between disjoint accounts never share a lock. An account with buckets
+    (see buckets.py) is credited in one of its buckets, after the Account rows.
+
+    Both accounts must be in the current shard; see execute_sharded_transfer.
+    """
+    if source_cpf == target_cpf:
+        raise SameAccountError(source_cpf)
+
+    with transaction.atomic(using=router.db_for_write(Account)):
+        buckets = {}
+        for cpf in sorted((source_cpf, target_cpf)):
+            if cpf == source_cpf:
+                if not debit_account(cpf, value):
+                    buckets[cpf] = -value
+            elif not credit_account(cpf, value):
+                buckets[cpf] = value
+        credited = move_buckets(buckets)
+
+        invalidate(source_cpf, target_cpf)
+        transfer = Transfer.objects.create(source_cpf=source_cpf, target_cpf=target_cpf, value=value)
+        record_entries([transfer])
+        record_daily_stats([transfer], buckets=credited)
+        return transfer
+
+
+def execute_batch(items):
+    """
+    Applies a list of transfers (dicts with source_cpf, target_cpf and value, in
+    cents) in a single transaction. The accounts involved are locked once, the
+    transfers are checked in order against the running balances kept in memory, and
+    the net change of each account is written with one bulk_update (balance =
+    balance + change) plus one bulk_create of the transfers and one of their
+    ledger entries.
+
+    Returns one entry per item, in the same order: the created Transfer, or the
+    TransferError explaining why that item was refused. Refused items do not stop
+    the others. The accounts must be in the current shard; see execute_sharded_batch.
+    """
+    cpfs = {item['source_cpf'] for item in items} | {item['target_cpf'] for item in items}
+    results = []
+    db = router.db_for_write(Account)
+    with transaction.atomic(using=db):
+        accounts = lock_accounts(cpfs)
+        # the buckets of an account (see buckets.py) pay for its debits too; nobody else
+        # can debit them while its Account row is locked
+        in_buckets = bucket_balances(cpfs)
+        balances = {cpf: account.balance + in_buckets.get(cpf, 0) for cpf, account in accounts.items()}
+        changes = defaultdict(int)
+        for item in items:
+            source_cpf, target_cpf, value = item['source_cpf'], item['target_cpf'], item['value']
+            if source_cpf == target_cpf:
+                results.append(SameAccountError(source_cpf))
+            elif source_cpf not in accounts or target_cpf not in accounts:
+                results.append(AccountNotFoundError(source_cpf if source_cpf not in accounts else target_cpf))
+            elif value > balances[source_cpf]:
+                results.append(InsufficientFundsError(source_cpf))
+            else:
+                balances[source_cpf] -= value
+                balances[target_cpf] += value
+                changes[source_cpf] -= value
+                changes[target_cpf] += value
+                results.append(Transfer(source_cpf=source_cpf, target_cpf=target_cpf, value=value))
+
+        changed, buckets = [], {}
+        for cpf, change in changes.items():
+            account = accounts[cpf]
+            if (change > 0 and account.bucket_count) or -change > account.balance:
+                buckets[cpf] = change
+                continue
+            account.balance = F('balance') + change
+            account.version = F('version') + 1
+            changed.append(account)
+        Account.objects.bulk_update(changed, ['balance', 'version'])
+        credited = move_buckets(buckets)
+        invalidate(*changes)
+        transfers = [result for result in results if isinstance(result, Transfer)]
+        if connections[db].features.can_return_rows_from_bulk_insert:
+            Transfer.objects.bulk_create(transfers)
+        else:
+            # the ledger entries need the ids, which this database does not return
+            # from a bulk insert
+            for transfer in transfers:
+                transfer.save(force_insert=True)
+        record_entries(transfers)
+        record_daily_stats(transfers, buckets=credited)
+    return results
+
+
+def record_daily_stats(transfers, sent=True, received=True, buckets=None):
+    """
+    Adds the transfers to the AccountDailyStats of both accounts (only the source
+    ones with received=False, only the target ones with sent=False). The transfers are
+    first summed per (account, day), so each row is written once however many
+    transfers touch it, and the rows are written in (cpf, day) order, like the
+    account locks. Must be called inside the transaction that creates the transfers.
+
+    buckets maps the cpfs credited in a bucket (see move_buckets) to its number: their
+    credits go to the row of that bucket, so a hot account has no single row of the day
+    either.
+    """
+    buckets = buckets or {}
+    deltas = defaultdict(lambda: [0, 0, 0, 0])
+    for transfer in transfers:
+        day = timezone.localdate(transfer.date)
+        if sent:
+            source = deltas[transfer.source_cpf, day, 0]
+            source[0] += 1
+            source[1] += transfer.value
+        if received:
+            target = deltas[transfer.target_cpf, day, buckets.get(transfer.target_cpf, 0)]
+            target[2] += 1
+            target[3] += transfer.value
+
+    for (cpf, day, bucket), (sent_count, sent_total, received_count, received_total) in sorted(deltas.items()):
+        changes = {'sent_count': sent_count, 'sent_total': sent_total,
+                   'received_count': received_count, 'received_total': received_total}
+        rows = AccountDailyStats.objects.filter(account_id=cpf, day=day, bucket=bucket)
+        if rows.update(**{field: F(field) + change for field, change in changes.items()}):
+            continue
+        try:
+            with transaction.atomic(using=router.db_for_write(AccountDailyStats)):
+                AccountDailyStats.objects.create(account_id=cpf, day=day, bucket=bucket, **changes)
+        except IntegrityError:
+            # another transfer created the row of the day meanwhile
+            rows.update(**{field: F(field) + change for field, change in changes.items()})
+
+
+# how long a transfer between shards may stay prepared before settle_transfers finishes it
+SETTLE_AFTER = timedelta(seconds=30)
+
+
+def execute_sharded_transfer(source_cpf, target_cpf, value):
+    """
+    execute_transfer for accounts that may be in different shards (see sharding.py):
+    in the shard of both accounts, or with execute_transfer_across_shards.
+    """
+    source_db = shard_for(source_cpf)
+    if source_db == shard_for(target_cpf):
+        with using_shard(source_db):
+            return execute_transfer(source_cpf, target_cpf, value)
+    return execute_transfer_across_shards(source_cpf, target_cpf, value)
+
+
+def execute_sharded_batch(items):
+    """
+    execute_batch for accounts that may be in different shards: the transfers within
+    a shard are applied as a batch in that shard, and then the transfers between
+    shards one by one. Returns the results in the order of items.
+    """
+    results = [None] * len(items)
+    local, across = [], []
+    for index, item in enumerate(items):
+        (local if shard_for(item['source_cpf']) == shard_for(item['target_cpf']) else across).append(index)
+    for db, indexes in split_by_shard(local, lambda index: items[index]['source_cpf']):
+        with using_shard(db):
+            for index, result in zip(indexes, execute_batch([items[index] for index in indexes])):
+                results[index] = result
+    for index in across:
+        item = items[index]
+        try:
+            results[index] = execute_transfer_across_shards(item['source_cpf'], item['target_cpf'], item['value'])
+        except TransferError as error:
+            results[index] = error
+    return results
+
+
+def execute_transfer_across_shards(source_cpf, target_cpf, value):
+    """
+    Moves value (in cents) between accounts of two shards. No transaction spans two
+    databases, so the transfer is made in steps, each one a transaction in a single
+    shard, recorded in a TransferIntent so that any step can be run again:
+
+    1. prepare, in the source shard: the source account is debited as in
+       execute_transfer, and the Transfer, its debit entry and the prepared intent
+       are written.
+    2. credit, in the target shard: the target account is credited, and a copy of
+       the Transfer, its credit entry and the intent, with the same id, are written.
+       The primary key of the intent makes this step happen once, however many
+       times it is tried.
+    3. commit, in the source shard: the intent is marked committed, or aborted when
+       the target account is gone, giving the money back with a reversal Transfer
+       from the target account.
+
+    A crash after step 1 leaves the intent prepared, and `manage.py settle_transfers`
+    finishes it. Returns the Transfer of the source shard.
+    """
+    if not Account.objects.using(shard_for(target_cpf)).filter(account_user=target_cpf).exists():
+        raise AccountNotFoundError(target_cpf)
+
+    with using_shard(shard_for(source_cpf)) as source_db, transaction.atomic(using=source_db):
+        if not debit_account(source_cpf, value):
+            move_buckets({source_cpf: -value})
+        invalidate(source_cpf)
+        transfer = Transfer.objects.create(source_cpf=source_cpf, target_cpf=target_cpf, value=value)
+        record_entries([transfer], credits=False)
+        intent = TransferIntent.objects.create(source_cpf=source_cpf, target_cpf=target_cpf, value=value,
+                                               transfer=transfer)
+    settle_intent(intent)
+    return transfer
+
+
+def _credit(intent):
+    """Step 2 of execute_transfer_across_shards. False when the target account does not exist."""
+    with using_shard(shard_for(intent.target_cpf)) as target_db:
+        try:
+            with transaction.atomic(using=target_db):
+                if TransferIntent.objects.filter(pk=intent.pk).exists():
+                    return True
+                try:
+                    in_row = credit_account(intent.target_cpf, intent.value)
+                except AccountNotFoundError:
+                    return False
+                credited = move_buckets({} if in_row else {intent.target_cpf: intent.value})
+                invalidate(intent.target_cpf)
+                credit = Transfer.objects.create(source_cpf=intent.source_cpf, target_cpf=intent.target_cpf,
+                                                 value=intent.value)
+                record_entries([credit], debits=False)
+                record_daily_stats([credit], sent=False, buckets=credited)
+                TransferIntent.objects.create(id=intent.pk, source_cpf=intent.source_cpf, target_cpf=intent.target_cpf,
+                                              value=intent.value, status=TransferIntent.CREDITED, transfer=credit)
+        except IntegrityError:
+            # a concurrent settle_intent credited it meanwhile
+            pass
+    return True
+
+
+def settle_intent(intent):
+    """Runs steps 2 and 3 of execute_transfer_across_shards for a prepared intent and returns its status."""
+    credited = _credit(intent)
+    with using_shard(shard_for(intent.source_cpf)) as source_db, transaction.atomic(using=source_db):
+        # locked, so two settle_intent can not both commit or abort it
+        intent = TransferIntent.objects.select_for_update().get(pk=intent.pk)
+        if intent.status != TransferIntent.PREPARED:
+            return intent.status
+        if credited:
+            intent.status = TransferIntent.COMMITTED
+            record_daily_stats([intent.transfer], received=False)
+        else:
+            # the transfer and its debit entry stay, as every ledger entry does: a
+            # reversal transfer, with its credit entry, gives the money back
+            in_row = credit_account(intent.source_cpf, intent.value)
+            refunded = move_buckets({} if in_row else {intent.source_cpf: intent.value})
+            invalidate(intent.source_cpf)
+            reversal = Transfer.objects.create(source_cpf=intent.target_cpf, target_cpf=intent.source_cpf,
+                                               value=intent.value)
+            record_entries([reversal], debits=False)
+            record_daily_stats([intent.transfer], received=False)
+            record_daily_stats([reversal], sent=False, buckets=refunded)
+            intent.status = TransferIntent.ABORTED
+        intent.save(update_fields=['status'])
+    return intent.status
+
+
+def settle_transfer_intents(older_than=SETTLE_AFTER):
+    """Settles the intents of every shard left prepared for longer than older_than; returns how many."""
+    moment = timezone.now() - older_than
+    prepared = gather(lambda db: list(TransferIntent.objects.filter(status=TransferIntent.PREPARED,
+                                                                    created__lt=moment).order_by('created')))
+    intents = list(chain.from_iterable(prepared))
+    for intent in intents:
+        settle_intent(intent)
+    return len(intents)
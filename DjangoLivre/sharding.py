@@ -0,0 +1,148 @@
+"""
+Accounts sharded by cpf across the DATABASE_SHARDS databases.
+
+Every client lives in the shard picked by a hash of its cpf, together with its
+account, its ledger, its stats and the transfers it performed (and a copy of the
+transfers it received, see services.execute_transfer_across_shards). The rest
+(idempotency keys, the transfer queue, admin, sessions) stays in 'default', which
+is also the first shard.
+
+ShardRouter sends the queries of the sharded models to the current shard, set by
+ShardMiddleware from the <cpf> of the url, or by `with using_shard(...)` in code
+that gets the cpf elsewhere. Code that has to see every shard (the lists of all
+users, accounts and transfers) calls gather(). With a single database every
+function here falls back to 'default', so the rest of the code does not need to
+know whether the accounts are sharded.
+"""
+import heapq
+import zlib
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from .async_db import closing_connections, read_pool
+from .cpf import normalize_cpf
+
+# model -> attribute with the cpf that picks its shard, for instances saved outside using_shard()
+SHARD_KEYS = {
+    'client': 'cpf',
+    'account': 'account_user_id',
+    'transfer': 'source_cpf',
+    'accountdailystats': 'account_id',
+    'ledgerentry': 'account_id',
+    'balancesnapshot': 'account_id',
+    'balancebucket': 'account_id',
+    'transferintent': 'source_cpf',
+}
+
+_current_shard = ContextVar('current_shard', default=None)
+
+
+def shards():
+    return settings.DATABASE_SHARDS
+
+
+def is_sharded():
+    return len(shards()) > 1
+
+
+def shard_for(cpf):
+    """Database alias of the shard of the cpf."""
+    aliases = shards()
+    if len(aliases) == 1:
+        return aliases[0]
+    return aliases[zlib.crc32(normalize_cpf(str(cpf)).encode()) % len(aliases)]
+
+
+@contextmanager
+def using_shard(alias):
+    """Sends the queries of the sharded models in the block to the shard `alias`."""
+    token = _current_shard.set(alias)
+    try:
+        yield alias
+    finally:
+        _current_shard.reset(token)
+
+
+def current_shard():
+    """The shard set by using_shard() or ShardMiddleware, None outside of them."""
+    return _current_shard.get()
+
+
+def set_current_shard(alias):
+    """Makes `alias` the current shard until the enclosing using_shard() block ends."""
+    _current_shard.set(alias)
+
+
+def split_by_shard(items, cpf):
+    """[(alias, items of that shard)] for the shards with items; cpf(item) is the cpf of an item."""
+    groups = {alias: [] for alias in shards()}
+    for item in items:
+        groups[shard_for(cpf(item))].append(item)
+    return [(alias, group) for alias, group in groups.items() if group]
+
+
+def gather(func):
+    """
+    Calls func(alias) inside using_shard(alias) for every shard and returns the
+    results in the order of shards(). With SHARD_GATHER_THREADS the shards are
+    queried at the same time, from the threads of the read pool (see async_db.py),
+    with the context variables of the caller.
+    """
+    def on_shard(alias):
+        with using_shard(alias):
+            return func(alias)
+
+    aliases = shards()
+    threads = settings.SHARD_GATHER_THREADS
+    if len(aliases) == 1 or not threads:
+        return [on_shard(alias) for alias in aliases]
+    # each call runs in a copy of the caller's context, so the pool threads see its
+    # context variables: the replica (replicas.py) and the request timing (middleware.py)
+    pool = read_pool(threads)
+    futures = [pool.submit(copy_context().run, closing_connections(on_shard), alias) for alias in aliases]
+    return [future.result() for future in futures]
+
+
+def merge(results, key, reverse=False):
+    """Merges the results of gather(), each one already sorted by key, into a single sorted iterator."""
+    return heapq.merge(*results, key=key, reverse=reverse)
+
+
+class ShardRouter:
+    """
+    Database router of the sharded models (SHARD_KEYS); the other models are left to
+    the next router, or to 'default'.
+    """
+
+    def _db(self, model, **hints):
+        if model._meta.app_label != 'DjangoLivre' or model._meta.model_name not in SHARD_KEYS:
+            return None
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        current = _current_shard.get()
+        if current is not None:
+            return current
+        if isinstance(instance, model):
+            cpf = getattr(instance, SHARD_KEYS[model._meta.model_name])
+            if cpf:
+                return shard_for(cpf)
+        return None
+
+    db_for_read = _db
+    db_for_write = _db
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if obj1._state.db in shards() and obj2._state.db in shards():
+            return obj1._state.db == obj2._state.db
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == DEFAULT_DB_ALIAS or db not in shards():
+            return None
+        # the other shards get the tables of this app only (the ones of the models
+        # that are not sharded stay empty there, deletes still look into them); the
+        # data migrations (model_name None) only run on 'default', which had the
+        # data before the accounts were sharded
+        return app_label == 'DjangoLivre' and model_name is not None
@@ -0,0 +1,67 @@
+"""
+Timing of the request being answered, shared by InstrumentationMiddleware (see
+middleware.py), which starts it and reports it, and by the code it measures: the
+queries (charged by a wrapper on every connection) and the serializers (see
+serializers.py).
+
+The timing is a context variable, so it follows the request into the threads that
+run its queries (async_db.py, sharding.gather) and is None outside a request.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+
+_current_timing = ContextVar('djangolivre_request_timing', default=None)
+
+
+class RequestTiming:
+    """
+    Adds up the queries of one request and the time spent on them, the time spent in
+    the serializers (without their queries) and the time spent rendering the response.
+    """
+
+    def __init__(self):
+        self.queries = 0
+        self.db = 0.0
+        self.serializing = False
+        self.serialize = 0.0
+        self.render_start = None
+        self.render = 0.0
+
+    def rendered(self, response):
+        self.render = perf_counter() - self.render_start
+
+
+def current_timing():
+    """The RequestTiming of the current request, None outside of one."""
+    return _current_timing.get()
+
+
+@contextmanager
+def timing_request(timing):
+    """Charges the queries and serializers of the block to timing."""
+    token = _current_timing.set(timing)
+    try:
+        yield timing
+    finally:
+        _current_timing.reset(token)
+
+
+@contextmanager
+def serializing():
+    """
+    Charges the block to the serializer time of the current request, less the time
+    of the queries it runs. Nested blocks (a serializer of each item of a list) are
+    only counted once, by the outermost.
+    """
+    timing = _current_timing.get()
+    if timing is None or timing.serializing:
+        yield
+        return
+    timing.serializing = True
+    db, start = timing.db, perf_counter()
+    try:
+        yield
+    finally:
+        timing.serialize += perf_counter() - start - (timing.db - db)
+        timing.serializing = False
@@ -0,0 +1,63 @@
+"""
+Database-backed queue of transfers, used by the transfer/ endpoint when
+TRANSFERS_QUEUED is on and drained by `manage.py run_transfer_workers`.
+
+The request only inserts a QueuedTransfer and answers 202, so a spike of transfers
+waits in the table instead of holding web workers on account locks. The workers
+take the pending transfers in batches and apply each batch with execute_batch: one
+lock per account and one write per account for the whole batch.
+
+Every transfer belongs to a partition derived from its source account, and a worker
+only takes the partitions assigned to it. Two workers therefore never debit the
+same account, and the transfers of one account are applied in the order they came
+in. Pending rows are claimed with SELECT ... FOR UPDATE SKIP LOCKED where the
+database supports it; SQLite allows a single writer, so run one worker process there.
+"""
+import zlib
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import QueuedTransfer, Transfer
+from .services import SameAccountError, ERROR_MESSAGES, execute_batch
+
+PARTITIONS = 1024
+BATCH_SIZE = 100
+
+
+def partition_of(cpf):
+    return zlib.crc32(cpf.encode()) % PARTITIONS
+
+
+def enqueue(source_cpf, target_cpf, value):
+    """Queues a transfer of value (in cents) and returns the QueuedTransfer."""
+    if source_cpf == target_cpf:
+        raise SameAccountError(source_cpf)
+    return QueuedTransfer.objects.create(source_cpf=source_cpf, target_cpf=target_cpf, value=value,
+                                         partition=partition_of(source_cpf))
+
+
+def process_batch(size=BATCH_SIZE, worker=0, workers=1):
+    """
+    Applies up to size pending transfers of the worker's partitions, in the order
+    they were queued, and returns how many were processed. The queue rows are
+    updated in the transaction of the transfers, so a crash leaves them pending.
+    """
+    with transaction.atomic():
+        pending = QueuedTransfer.objects.select_for_update(skip_locked=True).filter(status=QueuedTransfer.PENDING)
+        if workers > 1:
+            pending = pending.alias(worker=F('partition') % workers).filter(worker=worker)
+        queued = list(pending.order_by('created')[:size])
+        if not queued:
+            return 0
+
+        results = execute_batch([{'source_cpf': item.source_cpf, 'target_cpf': item.target_cpf, 'value': item.value}
+                                 for item in queued])
+        now = timezone.now()
+        for item, result in zip(queued, results):
+            if isinstance(result, Transfer):
+                item.status, item.transfer = QueuedTransfer.DONE, result
+            else:
+                item.status, item.error = QueuedTransfer.FAILED, ERROR_MESSAGES[type(result)]
+            item.processed = now
+        QueuedTransfer.objects.bulk_update(queued, ['status', 'transfer', 'error', 'processed'])
+    return len(queued)
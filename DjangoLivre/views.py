@@ -1,10 +1,33 @@
+import csv
 import http
-from django.db import transaction
+import json
+from itertools import chain
+from operator import itemgetter
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from django.db import router, transaction
+from django.db.models import Sum
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
 from rest_framework import status, generics
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from .models import Client, Transfer, Account
-from .serializers import TransferSerializer, AccountSerializer, ClientSerializer
+from .cache import get_account, get_client_data, invalidate
+from .conditional import account_etag, history_conditions
+from .models import Client, Transfer, Account, AccountDailyStats, QueuedTransfer
+from .money import from_cents
+from .onboarding import import_clients, read_csv
+from .filters import exclude_credit_copies, filter_date_range, filter_day_range, filter_history, parse_date_bound
+from .idempotency import idempotent
+from .ledger import balance_as_of
+from .metrics import render_metrics
+from .pagination import TransferKeysetPagination
+from .serializers import TransferSerializer, AccountSerializer, ClientSerializer, TransferRowSerializer, \
+    AccountDailyStatsSerializer, ClientRowSerializer, AccountRowSerializer, QueuedTransferSerializer
+from .services import execute_sharded_transfer, execute_sharded_batch, InsufficientFundsError, SameAccountError, \
+    AccountNotFoundError, ERROR_MESSAGES
+from .sharding import gather, is_sharded, merge, shard_for, shards, using_shard
+from .transfer_queue import enqueue
 
 
 class MainPage(APIView):
@@ -53,21 +76,75 @@ class CreateUser(APIView):
                 }
                 }
              """
-        serializer = self.serializer_class(data=request.data)
-        if serializer.is_valid():
-            if request.data['cpf'].isalnum():
-                with transaction.atomic():
-                    serializer.save()
-                    account = Account.objects.create(account_user_id=request.data['cpf'], )
-                    account.save()
-                return Response({'Usuário Cadastrado': serializer.data}, status=status.HTTP_201_CREATED)
-            return Response({'Erro': "O CPF deve ser sem ponto e traço"}, status=status.HTTP_400_BAD_REQUEST)
-        return Response(status=status.HTTP_400_BAD_REQUEST)
+        cpf = str(request.data.get('cpf', '')) if isinstance(request.data, dict) else ''
+        # the cpf is checked for duplicates, and saved, in its own shard
+        with using_shard(shard_for(cpf)) as db:
+            serializer = self.serializer_class(data=request.data)
+            if serializer.is_valid():
+                if request.data['cpf'].isalnum():
+                    with transaction.atomic(using=db):
+                        serializer.save()
+                        account = Account.objects.create(account_user_id=request.data['cpf'], )
+                        account.save()
+                        invalidate(request.data['cpf'])
+                    return Response({'Usuário Cadastrado': serializer.data}, status=status.HTTP_201_CREATED)
+                return Response({'Erro': "O CPF deve ser sem ponto e traço"}, status=status.HTTP_400_BAD_REQUEST)
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+
+
+class CreateUserBatch(APIView):
+    http_method_names = ['post', ]
+    """
+    Create many users (and their accounts) at once
+    """
+
+    def post(self, request):
+        """
+        It expects:
+            - POST as http method;
+            - url/create-users/batch/
+            - Either a CSV upload in the "file" field, with the header
+              cpf,name,phone,email, in UTF-8 or Windows-1252 (or in the charset of
+              the upload), or a JSON list of users like the body of url/create-user/
+
+        It returns:
+             - HTTP status = 400 when the CSV can not be decoded;
+             - HTTP status = 200;
+             - How many users were created and why the other rows were not
+               (the line of the CSV, or the position in the JSON list):
+               {
+                    "Usuários cadastrados": 1,
+                    "Linhas recusadas": [
+                        {
+                            "linha": 3,
+                            "cpf": "11111111111",
+                            "erros": ["CPF inválido"]
+                        }
+                    ]
+               }
+        """
+        upload = request.FILES.get('file')
+        if upload is not None:
+            charset = upload.charset
+            if isinstance(charset, bytes):
+                charset = charset.decode('latin-1')  # as the multipart parser of Django 3.2 leaves it
+            try:
+                rows = read_csv(upload.read(), charset)
+            except ValueError as error:
+                return Response({'Erro': str(error)}, status=status.HTTP_400_BAD_REQUEST)
+        elif isinstance(request.data, list):
+            rows = enumerate(request.data, start=1)
+        else:
+            return Response({'Erro': 'Envie um arquivo CSV no campo file ou uma lista JSON de usuários'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        created, rejected = import_clients(rows)
+        return Response({'Usuários cadastrados': created, 'Linhas recusadas': rejected}, status=status.HTTP_200_OK)
 
 
 class UserView(generics.ListAPIView):
     queryset = Client.objects.all()
     serializer_class = ClientSerializer
+    replica_reads = True
     """
     Lists registered users.
     """
@@ -97,9 +174,10 @@ class UserView(generics.ListAPIView):
                     }
                 ]
         """
-        users = self.get_queryset()
-        serializer = ClientSerializer(users, many=True)
-        return Response(serializer.data)
+        if is_sharded():
+            shards = gather(lambda db: ClientRowSerializer(self.get_queryset().order_by('cpf')).data)
+            return Response(list(merge(shards, key=itemgetter('cpf'))))
+        return Response(ClientRowSerializer(self.get_queryset()).data)
 
 
 class UserSearch(generics.ListAPIView):
@@ -125,9 +203,7 @@ class UserSearch(generics.ListAPIView):
                     "creation": "2021-12-01T18:05:29.214828Z"
                 }
         """
-        user = Client.objects.get(cpf=cpf)
-        serializer = ClientSerializer(user)
-        return Response(serializer.data, status=http.HTTPStatus.OK)
+        return Response(get_client_data(cpf), status=http.HTTPStatus.OK)
 
     def put(self, request, cpf):
         """
@@ -137,8 +213,9 @@ class UserSearch(generics.ListAPIView):
         user = Client.objects.get(cpf=cpf)
         serializer = ClientSerializer(user, data=request.data, partial=True)
         if serializer.is_valid():
-            with transaction.atomic():
+            with transaction.atomic(using=router.db_for_write(Client)):
                 serializer.save()
+                invalidate(cpf)
         return Response({'Usuário atualizado:': serializer.data}, status=http.HTTPStatus.OK)
 
     def delete(self, request, cpf):
@@ -148,6 +225,7 @@ class UserSearch(generics.ListAPIView):
         """
         user = Client.objects.get(cpf=cpf)
         user.delete()
+        invalidate(cpf)
         return Response(status=http.HTTPStatus.NO_CONTENT)
 
 
@@ -158,6 +236,7 @@ class CreateTransfer(APIView):
     Create a transfer and present what was created
     """
 
+    @idempotent
     def post(self, request):
         """
         Posts the new transfer:
@@ -165,56 +244,176 @@ class CreateTransfer(APIView):
                 - POST as http method;
                 - url/transfer/;
                 - Requires already registered source cpf and destination cpf
+                - Optional: an Idempotency-Key header. A retry with the same key
+                  gets the first response back instead of a new transfer
 
             It returns:
-                - HTTP status = 200;
+                - HTTP status = 200 (404 when the source or the target account does not exist);
                 - A JSON like this:
                  {
                     "Transferência realizada":
                         {
                             "id": 1,
                             "source_cpf": "97417972144",
-                            "target_cpf": "109.554.706-25",
+                            "target_cpf": "10955470625",
                             "value": 50.0,
                             "date": "2021-12-01T18:58:39.564256Z"
                         }
                 }
 
+            With TRANSFERS_QUEUED on, the transfer is only queued:
+                - HTTP status = 202, with the status url on the Location header;
+                - A JSON like this (see url/transfer/queue/id for the result):
+                {
+                    "Transferência na fila": {
+                        "id": "0c1a5bd0-8bb2-4a4e-9a43-7cbd5bde6a1e",
+                        "source_cpf": "97417972144",
+                        "target_cpf": "10955470625",
+                        "value": 50.0,
+                        "status": "pending",
+                        ...
+                    },
+                    "status_url": "http://127.0.0.1:8000/transfer/queue/0c1a5bd0-8bb2-4a4e-9a43-7cbd5bde6a1e/"
+                }
         """
         serializer = self.serializer_class(data=request.data)
         if serializer.is_valid():
-            if request.data['source_cpf'] != ['target_cpf']:
-                source_user = Account.objects.get(account_user=request.data['source_cpf'])
-                target_user = Account.objects.get(account_user=request.data['target_cpf'])
-                if float(request.data['value']) > source_user.balance:
-                    return Response(
-                        {"status": "O saldo da conta de origem deve ser maior que o valor da transferência"},
-                        status=status.HTTP_400_BAD_REQUEST)
-                elif source_user == target_user:
-                    return Response({"error": "Os usuários de destino e origem devem ser diferentes"},
-                                    status=status.HTTP_400_BAD_REQUEST)
-                else:
-                    source_user.balance = source_user.balance - float(request.data['value'])
-                    target_user.balance = target_user.balance + float(request.data['value'])
-                    with transaction.atomic():
-                        target_user.save()
-                        source_user.save()
-                        serializer.save()
-                    return Response({"Transferência realizada": serializer.data}, status=status.HTTP_201_CREATED)
-            return Response(status=status.HTTP_400_BAD_REQUEST)
+            data = serializer.validated_data
+            if settings.TRANSFERS_QUEUED:
+                return self.enqueue(request, data)
+            try:
+                transfer = execute_sharded_transfer(data['source_cpf'], data['target_cpf'], data['value'])
+            except InsufficientFundsError:
+                return Response(
+                    {"status": "O saldo da conta de origem deve ser maior que o valor da transferência"},
+                    status=status.HTTP_400_BAD_REQUEST)
+            except SameAccountError:
+                return Response({"error": "Os usuários de destino e origem devem ser diferentes"},
+                                status=status.HTTP_400_BAD_REQUEST)
+            except AccountNotFoundError:
+                return Response({"error": ERROR_MESSAGES[AccountNotFoundError]}, status=status.HTTP_404_NOT_FOUND)
+            return Response({"Transferência realizada": self.serializer_class(transfer).data},
+                            status=status.HTTP_201_CREATED)
         return Response({"error:": "Confira os dados informados"}, status=status.HTTP_400_BAD_REQUEST)
 
+    def enqueue(self, request, data):
+        try:
+            queued = enqueue(data['source_cpf'], data['target_cpf'], data['value'])
+        except SameAccountError:
+            return Response({"error": "Os usuários de destino e origem devem ser diferentes"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        status_url = request.build_absolute_uri(f'/transfer/queue/{queued.pk}/')
+        return Response({"Transferência na fila": QueuedTransferSerializer(queued).data, "status_url": status_url},
+                        status=status.HTTP_202_ACCEPTED, headers={'Location': status_url})
+
+
+class QueuedTransferView(APIView):
+    http_method_names = ['get', ]
+    serializer_class = QueuedTransferSerializer
+    """
+    Return the state of a transfer queued by url/transfer/
+    """
+
+    def get(self, request, pk):
+        """
+        It expects:
+            - GET as http method;
+            - The id of the queued transfer, specified on the url;
+            - url/transfer/queue/id
+        It returns:
+            - HTTP status = 200 (404 for an unknown id);
+            - A JSON like this, where status is pending, done or failed:
+                {
+                    "Transferência na fila": {
+                        "id": "0c1a5bd0-8bb2-4a4e-9a43-7cbd5bde6a1e",
+                        "source_cpf": "97417972144",
+                        "target_cpf": "10955470625",
+                        "value": 50.0,
+                        "status": "done",
+                        "error": "",
+                        "transfer": 7,
+                        "created": "2021-12-01T18:58:39.564256Z",
+                        "processed": "2021-12-01T18:58:40.102934Z"
+                    }
+                }
+        """
+        queued = QueuedTransfer.objects.filter(pk=pk).first()
+        if queued is None:
+            return Response({"error": "Transferência não encontrada"}, status=status.HTTP_404_NOT_FOUND)
+        return Response({"Transferência na fila": self.serializer_class(queued).data})
+
+
+class CreateTransferBatch(APIView):
+    serializer_class = TransferSerializer
+    http_method_names = ['post', ]
+    """
+    Create many transfers at once, in a single database transaction
+    """
+    errors = ERROR_MESSAGES
+
+    @idempotent
+    def post(self, request):
+        """
+        Posts a list of transfers:
+            It expects:
+                - POST as http method;
+                - url/transfers/batch/;
+                - A JSON list of transfers, each one like the body of url/transfer/
+                - Optional: an Idempotency-Key header, as in url/transfer/
+
+            It returns:
+                - HTTP status = 200 (or 400 when the list itself is invalid);
+                - One result per transfer, in the same order. The transfers are
+                  applied one after the other, so a refused transfer does not stop
+                  the others:
+                {
+                    "Transferências":
+                    [
+                        {
+                            "status": 201,
+                            "Transferência realizada": {
+                                "id": 3,
+                                "source_cpf": "97417972144",
+                                "target_cpf": "10955470625",
+                                "value": 50.0,
+                                "date": "2021-12-01T18:58:39.564256Z"
+                            }
+                        },
+                        {
+                            "status": 400,
+                            "error": "Os usuários de destino e origem devem ser diferentes"
+                        }
+                    ]
+                }
+        """
+        serializer = self.serializer_class(data=request.data, many=True)
+        if serializer.is_valid():
+            results = []
+            for result in execute_sharded_batch(serializer.validated_data):
+                if isinstance(result, Transfer):
+                    results.append({"status": status.HTTP_201_CREATED,
+                                    "Transferência realizada": self.serializer_class(result).data})
+                else:
+                    results.append({"status": status.HTTP_400_BAD_REQUEST, "error": self.errors[type(result)]})
+            return Response({"Transferências": results}, status=status.HTTP_200_OK)
+        return Response({"error:": "Confira os dados informados", "detalhes": serializer.errors},
+                        status=status.HTTP_400_BAD_REQUEST)
+
 
 class TransfersView(generics.ListAPIView):
     queryset = Transfer.objects.all()
     serializer_class = TransferSerializer
+    pagination_class = TransferKeysetPagination
+    replica_reads = True
     """
     Lists registered transfers.
     It expects:
         - GET as http method;
         - url/all-transfers/
+        - Optional: ?page_size=<n> and the ?cursor=<...> of the previous page
     It returns:
         - HTTP status = 200;
+        - A Link header pointing to the next page, when there is one;
         - A JSON like this:
             [
                 {
@@ -234,10 +433,70 @@ class TransfersView(generics.ListAPIView):
             ]
     """
 
+    def list(self, request):
+        if is_sharded():
+            transfers = self.paginator.paginate_shards(
+                lambda: TransferRowSerializer.values(exclude_credit_copies(self.get_queryset())), request, view=self)
+        else:
+            transfers = self.paginate_queryset(TransferRowSerializer.values(self.get_queryset()))
+        return self.get_paginated_response(TransferRowSerializer(transfers).data)
+
 
+class _Echo:
+    """File-like object that hands back what csv.writer writes, instead of buffering it."""
+
+    def write(self, value):
+        return value
+
+
+class ExportTransfers(APIView):
+    http_method_names = ['get', ]
+    """
+    Streams every transfer, for reconciliation.
+    """
+    content_types = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+
+    def get(self, request, export_format):
+        """
+        It expects:
+            - GET as http method;
+            - The format, ndjson or csv, specified on the url;
+            - url/transfers/export/ndjson/
+            - Optional: ?start=<date or datetime>&end=<date or datetime> (both inclusive)
+        It returns:
+            - HTTP status = 200;
+            - The transfers ordered by date, streamed while they are read from the
+              database, one per line:
+                {"id": 1, "source_cpf": "97417972144", "target_cpf": "10955470625", "value": 50.0, "date": "2021-12-01T18:58:39.564256Z"}
+                {"id": 2, "source_cpf": "10955470625", "target_cpf": "97417972144", "value": 50.0, "date": "2021-12-01T19:16:05.125610Z"}
+        """
+        if export_format not in self.content_types:
+            return Response({"error": "O formato deve ser ndjson ou csv"}, status=status.HTTP_400_BAD_REQUEST)
+
+        transfers = filter_date_range(Transfer.objects.order_by('date', 'id'), request.query_params)
+        if is_sharded():
+            # the transfers of every shard, merged by (date, id) while they are read
+            fields = TransferRowSerializer.get_fields()
+            transfers = merge([exclude_credit_copies(transfers.using(db)).values_list(*fields).iterator()
+                               for db in shards()], key=itemgetter(fields.index('date'), fields.index('id')))
+        rows = TransferRowSerializer(transfers)
+        if export_format == 'csv':
+            writer = csv.writer(_Echo())
+            lines = (writer.writerow(row) for row in rows.rows())
+            content = chain([writer.writerow(rows.get_fields())], lines)
+        else:
+            content = (json.dumps(row, ensure_ascii=False) + '\n' for row in rows.dicts())
+
+        response = StreamingHttpResponse(content, content_type=self.content_types[export_format])
+        response['Content-Disposition'] = f'attachment; filename="transfers.{export_format}"'
+        return response
+
+
+@method_decorator(condition(**history_conditions('source_cpf')), name='get')
 class TransfersPerformed(APIView):
     http_method_names = ['get', ]
     serializer_class = TransferSerializer
+    replica_reads = True
     """
     Lists transfers performed by a specific user.
     """
@@ -248,8 +507,14 @@ class TransfersPerformed(APIView):
             - GET as http method;
             - The ID-CPF, specified on the url;
             - url/transfers-performed/cpf
+            - Optional: ?page_size=<n> and the ?cursor=<...> of the previous page
+            - Optional: ?start=<date>&end=<date>, ?min_value=<reais>&max_value=<reais>,
+              ?counterparty=<cpf> and ?ordering=-date (newest first)
+            - Optional: If-None-Match or If-Modified-Since from a previous response
         It returns:
-            - HTTP status = 200;
+            - HTTP status = 200 with ETag and Last-Modified headers, or 304 when there is
+              no new transfer;
+            - A Link header pointing to the next page, when there is one;
             - A JSON like this:
                 {
                         "Histórico de transferências realizadas pelo usuário":
@@ -266,15 +531,18 @@ class TransfersPerformed(APIView):
 
         """
 
-        transferencias = Transfer.objects.filter(source_cpf=cpf)
-        serializer = TransferSerializer(transferencias, many=True)
-        return Response({"Histórico de transferências realizadas pelo usuário": serializer.data},
-                        status=status.HTTP_200_OK)
+        paginator = TransferKeysetPagination()
+        transferencias = paginator.paginate_queryset(
+            TransferRowSerializer.values(filter_history(cpf, request.query_params, 'performed')), request, view=self)
+        return paginator.get_paginated_response(
+            {"Histórico de transferências realizadas pelo usuário": TransferRowSerializer(transferencias).data})
 
 
+@method_decorator(condition(**history_conditions('target_cpf')), name='get')
 class TransfersReceived(APIView):
     http_method_names = ['get', ]
     serializer_class = TransferSerializer
+    replica_reads = True
     """
     Lists transfers received by a specific user.
     """
@@ -285,8 +553,14 @@ class TransfersReceived(APIView):
             - GET as http method;
             - The ID-CPF, specified on the url;
             - url/transfers-received/cpf
+            - Optional: ?page_size=<n> and the ?cursor=<...> of the previous page
+            - Optional: ?start=<date>&end=<date>, ?min_value=<reais>&max_value=<reais>,
+              ?counterparty=<cpf> and ?ordering=-date (newest first)
+            - Optional: If-None-Match or If-Modified-Since from a previous response
         It returns:
-            - HTTP status = 200;
+            - HTTP status = 200 with ETag and Last-Modified headers, or 304 when there is
+              no new transfer;
+            - A Link header pointing to the next page, when there is one;
             - A JSON like this:
                 {
                     "Histórico de transferências recebidas pelo usuário":
@@ -302,15 +576,65 @@ class TransfersReceived(APIView):
                 }
         """
 
-        transfers = Transfer.objects.filter(target_cpf=cpf)
-        serializer = TransferSerializer(transfers, many=True)
-        return Response({"Histórico de transferências recebidas pelo usuário": serializer.data},
-                        status=status.HTTP_200_OK)
+        paginator = TransferKeysetPagination()
+        transfers = paginator.paginate_queryset(
+            TransferRowSerializer.values(filter_history(cpf, request.query_params, 'received')), request, view=self)
+        return paginator.get_paginated_response(
+            {"Histórico de transferências recebidas pelo usuário": TransferRowSerializer(transfers).data})
+
+
+@method_decorator(condition(**history_conditions('source_cpf', 'target_cpf')), name='get')
+class TransferHistory(APIView):
+    http_method_names = ['get', ]
+    serializer_class = TransferSerializer
+    replica_reads = True
+    """
+    Lists the transfers performed and received by a specific user, in one query.
+    """
+
+    def get(self, request, cpf):
+        """
+        It expects:
+            - GET as http method;
+            - The ID-CPF, specified on the url;
+            - url/transfers/cpf
+            - The same optional parameters as url/transfers-performed/cpf
+        It returns:
+            - HTTP status = 200 with ETag and Last-Modified headers, or 304 when there is
+              no new transfer;
+            - A Link header pointing to the next page, when there is one;
+            - A JSON like this:
+                {
+                    "Histórico de transferências do usuário":
+                    [
+                        {
+                            "id": 1,
+                            "source_cpf": "97417972144",
+                            "target_cpf": "10955470625",
+                            "value": 50.0,
+                            "date": "2021-12-01T18:58:39.564256Z"
+                        },
+                        {
+                            "id": 2,
+                            "source_cpf": "10955470625",
+                            "target_cpf": "97417972144",
+                            "value": 50.0,
+                            "date": "2021-12-01T19:16:05.125610Z"
+                        }
+                    ]
+                }
+        """
+        paginator = TransferKeysetPagination()
+        transfers = paginator.paginate_queryset(
+            TransferRowSerializer.values(filter_history(cpf, request.query_params)), request, view=self)
+        return paginator.get_paginated_response(
+            {"Histórico de transferências do usuário": TransferRowSerializer(transfers).data})
 
 
 class AccountsView(generics.ListAPIView):
     queryset = Account.objects.all()
     serializer_class = AccountSerializer
+    replica_reads = True
     """
     List all registered accounts
     
@@ -334,8 +658,15 @@ class AccountsView(generics.ListAPIView):
             ]
     """
 
+    def list(self, request):
+        if is_sharded():
+            shards = gather(lambda db: AccountRowSerializer(self.get_queryset().order_by('account_user')).data)
+            return Response(list(merge(shards, key=itemgetter('account_user'))))
+        return Response(AccountRowSerializer(self.get_queryset()).data)
+
 
 
+@method_decorator(condition(etag_func=account_etag), name='get')
 class AccountView(APIView):
     http_method_names = ['get', ]
     serializer_class = AccountSerializer
@@ -349,8 +680,9 @@ class AccountView(APIView):
             - GET as http method;
             - The ID-CPF, specified on the url;
             - url/account/cpf
+            - Optional: If-None-Match with the ETag of a previous response
         It returns:
-            - HTTP status = 200;
+            - HTTP status = 200 and an ETag header, or 304 when the account did not change;
             - A JSON like this:
                 {
                     "account_user": "97417972144",
@@ -358,13 +690,117 @@ class AccountView(APIView):
                     "balance": 5000
                 }
         """
-        user = Account.objects.get(account_user=cpf)
-        serializer = AccountSerializer(user)
-        return Response(serializer.data)
-
-
+        # the account read by account_etag, so the body is the one its ETag describes
+        account = getattr(request, '_account', None) or get_account(cpf)
+        return Response(account['data'])
 
 
+class AccountStats(APIView):
+    http_method_names = ['get', ]
+    serializer_class = AccountDailyStatsSerializer
+    """
+    Return the transfer statistics of a specific account, day by day
+    """
 
+    def get(self, request, cpf):
+        """
+        It expects:
+            - GET as http method;
+            - The ID-CPF, specified on the url;
+            - url/account/cpf/stats/
+            - Optional: ?start=<date>&end=<date> (both inclusive)
+        It returns:
+            - HTTP status = 200;
+            - A JSON like this:
+                {
+                    "Estatísticas da conta": {
+                        "total": {
+                            "sent_count": 1,
+                            "sent_total": 50.0,
+                            "received_count": 1,
+                            "received_total": 50.0
+                        },
+                        "dias": [
+                            {
+                                "day": "2021-12-01",
+                                "sent_count": 1,
+                                "sent_total": 50.0,
+                                "received_count": 1,
+                                "received_total": 50.0
+                            }
+                        ]
+                    }
+                }
+        """
+        stats = filter_day_range(AccountDailyStats.objects.filter(account_id=cpf), request.query_params)
+        fields = ('sent_count', 'sent_total', 'received_count', 'received_total')
+        total = {field: value or 0 for field, value in stats.aggregate(**{field: Sum(field) for field in fields}).items()}
+        total['sent_total'] = from_cents(total['sent_total'])
+        total['received_total'] = from_cents(total['received_total'])
+        # an account with buckets has one row per bucket and day (see buckets.py)
+        days = stats.order_by('day').values('day').annotate(**{field: Sum(field) for field in fields})
+        serializer = self.serializer_class(days, many=True)
+        return Response({"Estatísticas da conta": {
+            "total": total,
+            "dias": serializer.data,
+        }})
+
+
+class AccountBalance(APIView):
+    http_method_names = ['get', ]
+    """
+    Return the balance of a specific account at a given moment, from the ledger
+    """
 
+    def get(self, request, cpf):
+        """
+        It expects:
+            - GET as http method;
+            - The ID-CPF, specified on the url;
+            - url/account/cpf/balance/?at=<date>
+            - ?at= is a datetime (2021-12-01T18:58:39) or a date (2021-12-01, the end of that day)
+        It returns:
+            - HTTP status = 200 (404 when there is no account with the cpf);
+            - A JSON like this:
+                {
+                    "Saldo da conta": {
+                        "account_user": "97417972144",
+                        "at": "2021-12-01",
+                        "balance": 4950.0
+                    }
+                }
+        """
+        at = request.query_params.get('at')
+        if not at:
+            return Response({"error": "Informe a data em ?at="}, status=status.HTTP_400_BAD_REQUEST)
+        moment, inclusive = parse_date_bound(at, end=True)
+        try:
+            balance = balance_as_of(cpf, moment, inclusive)
+        except Account.DoesNotExist:
+            return Response({"error": "Conta não encontrada"}, status=status.HTTP_404_NOT_FOUND)
+        return Response({"Saldo da conta": {
+            "account_user": cpf,
+            "at": at,
+            "balance": from_cents(balance),
+        }})
+
+
+class Metrics(APIView):
+    http_method_names = ['get', ]
+    """
+    Request metrics of this process, for Prometheus
+    """
 
+    def get(self, request):
+        """
+        It expects:
+            - GET as http method;
+            - url/metrics/
+        It returns:
+            - HTTP status = 200;
+            - Histograms of latency, SQL time, serializer time, render time and SQL queries per view,
+              in the Prometheus text format:
+                djangolivre_request_duration_seconds_bucket{view="AccountView",method="GET",le="0.005"} 12
+                ...
+        """
+        return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')